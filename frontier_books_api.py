@@ -1,35 +1,150 @@
 import asyncio
 import asyncpg
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from fastapi import FastAPI, HTTPException, Depends, Request, status, Form, Header
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status, Form, Header, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
+import gzip
+import hashlib
+import heapq
+import io
 from jose import JWTError, jwt
 import json
+import os
 from passlib.context import CryptContext
-from pydantic import BaseModel, Field
+from pathlib import Path
+from pydantic import BaseModel, Field, ValidationError
+from starlette.datastructures import Headers, MutableHeaders
 import random
+import re
+import sys
+import threading
+import time
 from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+import uuid
+import zlib
+
+from frontier_books_config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, SHARD_DATABASES
+from frontier_books_migrations import check_shard_settings
+from frontier_books_words import words
 
 
 # ========================================
 # Configuration Values
 # ========================================
 
-# --- Database Connection Values ---
-DB_USER = "postgres"
-DB_PASSWORD = "spark"
-DB_NAME = "frontier_books"
-DB_HOST = "localhost"
-DB_PORT = 5432
-
 # --- JWT Values ---
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRATION_DELTA_MINUTES_NEW = 60
 ACCESS_TOKEN_EXPIRATION_DELTA_MINUTES_RETURNING = 45
 
+# --- Response Compression Values ---
+# Responses smaller than this (in bytes) are sent uncompressed
+RESPONSE_COMPRESSION_MINIMUM_SIZE = 1024
+RESPONSE_COMPRESSION_LEVEL = 6
+
+# Content type prefixes sent uncompressed, gzip would hold streamed events back until its buffer fills
+# and images are already compressed
+RESPONSE_COMPRESSION_EXCLUDED_CONTENT_TYPES = ["text/event-stream", "image/"]
+
+# --- Sparse Fieldset Values ---
+# Columns that may be requested through the 'fields' query parameter on book endpoints
+BOOK_SELECTABLE_FIELDS = ["book_id", "title", "author", "description", "price", "cover_image_url", "created_at"]
+
+# --- Event Stream Values ---
+EVENT_CHANNEL = "frontier_books_events"
+EVENT_QUEUE_MAX_SIZE = 100
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_LISTENER_HEALTH_CHECK_SECONDS = 10
+EVENT_LISTENER_RETRY_SECONDS = 2
+
+# --- Batch Values ---
+BATCH_MAX_REQUESTS = 20
+# Kept below the pool's max_size so a batch can't starve other requests of connections
+BATCH_MAX_CONCURRENCY = 4
+
+# --- Profiling Values ---
+# Admins send this header with a value of "1" to profile a single request
+PROFILE_HEADER = "X-Profile"
+# Profile every request and keep those slower than this, None disables threshold profiling
+PROFILE_LATENCY_THRESHOLD_SECONDS = None
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILE_OUTPUT_DIRECTORY = Path("profiles")
+
+# --- Cover Image Values ---
+COVER_STORAGE_DIRECTORY = Path("covers")
+COVER_BASE_URL = "https://findthefrontier.ca/frontier_books/covers"
+COVER_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+COVER_THUMBNAIL_WIDTHS = [200, 400]
+COVER_THUMBNAIL_WORKERS = 2
+COVER_FORMAT_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+# Asset names contain the content hash, so a name's bytes never change
+COVER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# ========================================
+# Queries
+# ========================================
+# Every statement the endpoints run. tests/test_query_plans.py EXPLAINs each QUERY_* constant
+# against a seeded database, so a new query can't skip the index check. Braced names are
+# filled in by the endpoint, only ever with validated column, table and placeholder names.
+
+# --- Users ---
+QUERY_CREATE_USER = "INSERT INTO users (username, email, password_hash, created_at) VALUES ($1, $2, $3, $4) RETURNING user_id"
+QUERY_GET_ALL_USERS = "SELECT user_id, username, email, role from users ORDER BY user_id ASC"
+QUERY_GET_USER_BY_EMAIL = "SELECT * FROM users WHERE email = $1"
+
+# --- Books ---
+QUERY_CREATE_BOOK = "INSERT INTO books (title, author, description, price, cover_image_url, created_at) VALUES ($1, $2, $3, $4, $5, $6) RETURNING book_id"
+QUERY_GET_ALL_BOOKS = "SELECT {columns} from books ORDER BY RANDOM()"
+QUERY_GET_BOOK_BY_ID = "SELECT * from books WHERE book_id = $1"
+QUERY_GET_BOOKS_BY_IDS = "SELECT {columns} FROM books WHERE book_id = ANY($1)"
+QUERY_UPDATE_BOOK_COVER = "UPDATE books SET cover_image_url = $1 WHERE book_id = $2 RETURNING book_id"
+
+# --- Carts (User's Shard) ---
+QUERY_CLEAR_CART = "DELETE FROM cart_items WHERE user_id = $1"
+QUERY_UPSERT_CART_ITEM = (
+    "INSERT INTO cart_items (user_id, book_id, quantity, added_at) VALUES ($1, $2, $3, $4) "
+    "ON CONFLICT (user_id, book_id) DO UPDATE SET quantity = EXCLUDED.quantity"
+)
+QUERY_GET_CART = "SELECT book_id, quantity FROM cart_items WHERE user_id = $1"
+QUERY_REMOVE_BOOK_FROM_CARTS = "DELETE FROM cart_items WHERE book_id = $1"
+
+# --- Checkout and Orders (User's Shard, Gift Cards in the Main Database) ---
+QUERY_GET_GIFT_CARD_BALANCE = "SELECT balance FROM gift_cards WHERE giftcard_code = $1"
+QUERY_CREATE_ORDER = (
+    "INSERT INTO orders (user_id, total_amount, order_status, created_at, delivery_address, payment_info) "
+    "VALUES ($1, $2, 'Pending', $3, $4, $5) RETURNING order_id"
+)
+QUERY_CREATE_ORDER_ITEM = "INSERT INTO order_items (order_id, book_id, quantity, unit_price) VALUES ($1, $2, $3, $4)"
+QUERY_GET_USER_ORDERS = "SELECT *, order_items.book_id, order_items.quantity FROM orders JOIN order_items on orders.order_id = order_items.order_id WHERE orders.user_id = $1"
+QUERY_GET_ALL_ORDERS = "SELECT *, order_items.book_id, order_items.quantity FROM orders JOIN order_items on orders.order_id = order_items.order_id ORDER BY orders.created_at, orders.order_id"
+QUERY_REMOVE_USER_ORDERS = "DELETE FROM orders WHERE user_id = $1"
+
+# --- Reviews ---
+QUERY_CREATE_REVIEW = "INSERT INTO reviews (user_id, book_id, rating, review_text, created_at) VALUES ($1, $2, $3, $4, $5)"
+QUERY_GET_BOOK_REVIEWS = "SELECT u.username, r.rating, r.review_text FROM reviews r JOIN users u ON r.user_id = u.user_id WHERE r.book_id = $1"
+
+# --- Admin Entries (Modify and Remove) ---
+QUERY_GET_ENTRY = "SELECT * FROM {entity} WHERE {id_field} = $1"
+QUERY_UPDATE_ENTRY = "UPDATE {entity} SET {fields} WHERE {id_field} = ${id_parameter}"
+QUERY_REMOVE_ENTRY = "DELETE FROM {entity} WHERE {id_field} = $1"
+
+# Entities admins may modify or remove: (id field, fields that may be modified)
+ENTRY_TABLES = {
+    "books": ("book_id", ["title", "author", "description", "price", "cover_image_url"]),
+    "users": ("user_id", ["username", "email", "role"]),
+    "orders": ("order_id", ["order_status"])
+}
+
+# --- Events ---
+QUERY_PUBLISH_EVENT = "SELECT pg_notify($1, $2)"
+
 # Cryptography context for password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -42,6 +157,13 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 # --- Lifecycle ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Worker processes for thumbnail generation, keeping image work off the event loop
+    app.state.thumbnail_pool = ProcessPoolExecutor(max_workers=COVER_THUMBNAIL_WORKERS)
+
+    app.state.db_pool = None
+    app.state.shard_pools = []
+    app.state.event_subscribers = set()
+    app.state.event_listener_tasks = []
     try:
         # Create Connection Pool on Startup
         app.state.db_pool = await asyncpg.create_pool(
@@ -53,16 +175,341 @@ async def lifespan(app: FastAPI):
             min_size=2,
             max_size=10
         )
+
+        # Create a Connection Pool per Shard, the main pool doubles as the only shard when unsharded
+        app.state.shard_pools = [app.state.db_pool]
+        if SHARD_DATABASES:
+            app.state.shard_pools = []
+            for shard_index, shard_database in enumerate(SHARD_DATABASES):
+                app.state.shard_pools.append(await asyncpg.create_pool(
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    min_size=2,
+                    max_size=10,
+                    **shard_database
+                ))
+                await check_shard_settings(app.state.shard_pools[-1], shard_index, len(SHARD_DATABASES))
+
+        # Single LISTEN connection per database per worker, fanned out to every event stream subscriber
+        for listener_database in [{"host": DB_HOST, "port": DB_PORT, "database": DB_NAME}] + SHARD_DATABASES:
+            event_listener = None
+            try:
+                event_listener = await connect_event_listener(listener_database)
+            except Exception as e:
+                if listener_database in SHARD_DATABASES:
+                    raise
+                # The supervisor keeps retrying, /events starts delivering once it connects
+                print(f"Error Creating Event Listener: {str(e)}")
+            app.state.event_listener_tasks.append(asyncio.create_task(supervise_event_listener(listener_database, event_listener)))
+
     except Exception as e:
-        print(f"Error Creating Database Pool: {str(e)}")
+        # Without the main database or one of the shards some requests could never be served, so the app doesn't start
+        print(f"Error Connecting to Databases: {str(e)}")
+        await close_app_resources(app)
+        raise
+
     yield
-    print("Closing Database Pool...")
-    await app.state.db_pool.close()
-    print("Database Connection Closed.")
+    await close_app_resources(app)
+
+# --- Close Everything the Lifecycle Opened ---
+async def close_app_resources(app: FastAPI):
+    print("Closing Event Listeners...")
+    for event_listener_task in app.state.event_listener_tasks:
+        event_listener_task.cancel()
+    await asyncio.gather(*app.state.event_listener_tasks, return_exceptions=True)
+    if SHARD_DATABASES:
+        print("Closing Shard Pools...")
+        for shard_pool in app.state.shard_pools:
+            await shard_pool.close()
+    if app.state.db_pool is not None:
+        print("Closing Database Pool...")
+        await app.state.db_pool.close()
+        print("Database Connection Closed.")
+    app.state.thumbnail_pool.shutdown()
+
+
+# --- Fan Out a Database Notification to Event Stream Subscribers ---
+def dispatch_event(connection, pid, channel, payload):
+    for subscriber_queue in list(app.state.event_subscribers):
+        # Drop the oldest event when a slow subscriber's queue is full
+        if subscriber_queue.full():
+            subscriber_queue.get_nowait()
+        subscriber_queue.put_nowait(payload)
+
+# --- Open a LISTEN Connection to One Database ---
+async def connect_event_listener(listener_database: dict):
+    event_listener = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **listener_database)
+    await event_listener.add_listener(EVENT_CHANNEL, dispatch_event)
+    return event_listener
+
+# --- Keep a Database's LISTEN Connection Alive, Reconnecting whenever it Drops ---
+async def supervise_event_listener(listener_database: dict, event_listener=None):
+    while True:
+        if event_listener is None:
+            try:
+                event_listener = await connect_event_listener(listener_database)
+            except Exception as e:
+                print(f"Error Reconnecting Event Listener: {str(e)}")
+                await asyncio.sleep(EVENT_LISTENER_RETRY_SECONDS)
+                continue
+
+            # Notifications sent while disconnected are lost, so subscribers refetch what they show
+            dispatch_event(None, None, EVENT_CHANNEL, json.dumps({"event": "resync"}))
+
+        connection_lost = asyncio.Event()
+        event_listener.add_termination_listener(lambda connection: connection_lost.set())
+        try:
+            while not connection_lost.is_set():
+                try:
+                    await asyncio.wait_for(connection_lost.wait(), timeout=EVENT_LISTENER_HEALTH_CHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    # A silent network drop never terminates the connection, so probe it
+                    await event_listener.execute("SELECT 1", timeout=EVENT_LISTENER_HEALTH_CHECK_SECONDS)
+            print("Event Listener Connection Lost, Reconnecting...")
+        except Exception as e:
+            print(f"Event Listener Health Check Failed, Reconnecting: {str(e)}")
+        finally:
+            # Also runs when the task is cancelled on shutdown
+            event_listener.terminate()
+        event_listener = None
+
+
+# ========================================
+# Profiling
+# ========================================
+
+# Profiled request tasks -> (event loop thread id, folded stack sample counts)
+active_profiles = {}
+active_profiles_lock = threading.Lock()
+profile_sampler_thread = None
+
+# --- Format a Frame for a Folded Stack ---
+def format_profile_frame(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}:{frame.f_lineno}"
+
+# --- Collapse a Task's Current Stack into a Single Folded Line ---
+def collapse_task_stack(task, thread_frame) -> Optional[str]:
+    coroutine = task.get_coro()
+    task_frame = getattr(coroutine, "cr_frame", None)
+    if task_frame is None:
+        return None
+
+    # Walk the thread's stack back to the task's outermost frame, if the task is running it is on it
+    running_frames = []
+    while thread_frame is not None:
+        running_frames.append(thread_frame)
+        if thread_frame is task_frame:
+            return ";".join(["[cpu]"] + [format_profile_frame(frame) for frame in reversed(running_frames)])
+        thread_frame = thread_frame.f_back
+
+    # Otherwise the task is suspended, follow its await chain down to where it is waiting
+    awaiting_frames = []
+    awaitable = coroutine
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) or getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            break
+        awaiting_frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) or getattr(awaitable, "ag_await", None)
+
+    awaiting_label = "[awaiting]"
+    if any(frame.f_globals.get("__name__", "").startswith("asyncpg") for frame in awaiting_frames):
+        awaiting_label = "[awaiting asyncpg]"
+
+    return ";".join([awaiting_label] + [format_profile_frame(frame) for frame in awaiting_frames])
+
+# --- Sample Every Profiled Task until None are Left ---
+def sample_active_profiles():
+    global profile_sampler_thread
+
+    while True:
+        time.sleep(PROFILE_SAMPLE_INTERVAL_SECONDS)
+
+        with active_profiles_lock:
+            # Exit when idle so there is no sampling overhead between profiled requests
+            if not active_profiles:
+                profile_sampler_thread = None
+                return
+            profiles = list(active_profiles.items())
+
+        thread_frames = sys._current_frames()
+        for task, (thread_id, stack_counts) in profiles:
+            stack = collapse_task_stack(task, thread_frames.get(thread_id))
+            if stack:
+                stack_counts[stack] += 1
+
+# --- Save Folded Stacks in a Flamegraph-Ready File ---
+def save_profile(profile_id: str, stack_counts: Counter) -> None:
+    PROFILE_OUTPUT_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    with open(PROFILE_OUTPUT_DIRECTORY / f"{profile_id}.folded", "w") as profile_file:
+        for stack, count in stack_counts.most_common():
+            profile_file.write(f"{stack} {count}\n")
+
+# --- Profile the Request's Handler when Asked by an Admin or when Slow ---
+async def profile_request(request: Request, response: Response):
+    profile_requested = False
+    if request.headers.get(PROFILE_HEADER) == "1":
+        try:
+            profile_requested = (await verify_user(request.headers.get("authorization")))['user_role'] == 'admin'
+        except HTTPException:
+            # Non-admins are served normally, the endpoint handles their authorization
+            profile_requested = False
+
+    # Nothing to do unless profiling is on, keeping the disabled cost to the header check
+    if not profile_requested and PROFILE_LATENCY_THRESHOLD_SECONDS is None:
+        yield
+        return
+
+    global profile_sampler_thread
+    task = asyncio.current_task()
+    stack_counts = Counter()
+    profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{request.method}_{uuid.uuid4().hex[:8]}"
+    if profile_requested:
+        response.headers["X-Profile-Id"] = profile_id
+
+    with active_profiles_lock:
+        active_profiles[task] = (threading.get_ident(), stack_counts)
+        if profile_sampler_thread is None:
+            profile_sampler_thread = threading.Thread(target=sample_active_profiles, name="profile-sampler", daemon=True)
+            profile_sampler_thread.start()
+
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_seconds = time.perf_counter() - started_at
+        with active_profiles_lock:
+            active_profiles.pop(task, None)
+
+        slow_request = PROFILE_LATENCY_THRESHOLD_SECONDS is not None and elapsed_seconds >= PROFILE_LATENCY_THRESHOLD_SECONDS
+        if stack_counts and (profile_requested or slow_request):
+            save_profile(profile_id, stack_counts)
+            print(f"Saved Profile {profile_id}: {request.url.path} took {elapsed_seconds * 1000:.1f}ms")
+
+
+# --- Gzip Large Responses except for Excluded Content Types ---
+class SelectiveGZipMiddleware:
+    # Decides per response once its headers are known, independent of the installed Starlette version
+    def __init__(self, app, minimum_size: int, compresslevel: int, excluded_content_types: List[str]):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.excluded_content_types = excluded_content_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] == 206
+                    or any(content_type.startswith(excluded_type) for excluded_type in self.excluded_content_types)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether compression is worth it
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                # A file sent by path (ASGI pathsend) can't be compressed, its headers go out as they are
+                if start_message is not None:
+                    passthrough = True
+                    await send(start_message)
+                    start_message = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+
+                # Small single chunk responses go out untouched
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+                else:
+                    body = gzip.compress(body, compresslevel=self.compresslevel)
+                    headers["Content-Length"] = str(len(body))
+
+                await send(start_message)
+                start_message = None
+                if compressor is None:
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            compressed_body = compressor.compress(body)
+            if not more_body:
+                compressed_body += compressor.flush()
+            await send({"type": "http.response.body", "body": compressed_body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+# --- Store a Cover Image and its Thumbnails (Runs in the Thumbnail Pool) ---
+def store_cover_assets(image_bytes: bytes, cover_hash: str) -> List[str]:
+    # Imported here so only the thumbnail workers load Pillow
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as cover_image:
+            extension = COVER_FORMAT_EXTENSIONS.get(cover_image.format)
+            if extension is None:
+                raise ValueError(f"Unsupported image format {cover_image.format}")
+
+            # Decode the whole image before writing anything, open only reads the header and a
+            # truncated upload would otherwise be stored and served as an immutable cover
+            cover_image.load()
+
+            COVER_STORAGE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+            asset_names = [f"{cover_hash}.{extension}"] + [f"{cover_hash}_w{width}.webp" for width in COVER_THUMBNAIL_WIDTHS]
+
+            # Same hash means same bytes, an earlier upload already produced every asset
+            if all((COVER_STORAGE_DIRECTORY / asset_name).is_file() for asset_name in asset_names):
+                return asset_names
+
+            # Write to a temporary name and rename, so a half written asset is never served
+            original_path = COVER_STORAGE_DIRECTORY / asset_names[0]
+            with open(f"{original_path}.tmp", "wb") as original_file:
+                original_file.write(image_bytes)
+            os.replace(f"{original_path}.tmp", original_path)
+
+            for width, asset_name in zip(COVER_THUMBNAIL_WIDTHS, asset_names[1:]):
+                thumbnail = cover_image.convert("RGB")
+                thumbnail.thumbnail((width, width * 2))
+                thumbnail_path = COVER_STORAGE_DIRECTORY / asset_name
+                thumbnail.save(f"{thumbnail_path}.tmp", format="WEBP", quality=80)
+                os.replace(f"{thumbnail_path}.tmp", thumbnail_path)
+    except Image.DecompressionBombError as e:
+        # Reported like any other unreadable upload
+        raise ValueError(str(e)) from e
+
+    return asset_names
 
 
 # --- FastAPI App ---
-app = FastAPI(lifespan=lifespan, root_path="/frontier_books")
+app = FastAPI(lifespan=lifespan, root_path="/frontier_books", dependencies=[Depends(profile_request)])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -70,6 +517,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=RESPONSE_COMPRESSION_MINIMUM_SIZE,
+    compresslevel=RESPONSE_COMPRESSION_LEVEL,
+    excluded_content_types=RESPONSE_COMPRESSION_EXCLUDED_CONTENT_TYPES
+)
 
 
 # ========================================
@@ -91,6 +544,11 @@ class General_CartItem(BaseModel):
 class General_IntList(BaseModel):
     int_list: List[int]
 
+class General_BatchRequest(BaseModel):
+    method: str = "GET"
+    path: str
+    body: Optional[dict] = None
+
 # --- GET ---
 class Get_Book(BaseModel):
     book_id: int
@@ -136,6 +594,9 @@ class Post_Order(BaseModel):
     order_payment_details: str
     order_delivery_address: str
 
+class Post_Batch(BaseModel):
+    requests: List[General_BatchRequest]
+
 class Review(BaseModel):
     review_book_id: int
     review_book_rating: int = Field(..., ge=1, le=5, description="Rating must be between 1 and 5")
@@ -146,10 +607,70 @@ class Review(BaseModel):
 # Helper Functions
 # ========================================
 
+# --- Lazily Leased Database Connection ---
+class LazyDBConnection:
+    # Acquires a pool connection on the first query and holds it until released, so requests
+    # that fail before touching the database never take one and the rest pay for one acquire
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self.connection = None
+
+    async def acquire(self):
+        if self.connection is None:
+            self.connection = await self.db_pool.acquire()
+        return self.connection
+
+    async def release(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await self.db_pool.release(connection)
+
+    async def run(self, method: str, *args, **kwargs):
+        connection = await self.acquire()
+        return await getattr(connection, method)(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        return await self.run("fetch", *args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        return await self.run("fetchrow", *args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        return await self.run("fetchval", *args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self.run("execute", *args, **kwargs)
+
+    @asynccontextmanager
+    async def transaction(self):
+        connection = await self.acquire()
+        async with connection.transaction():
+            yield connection
+
+# --- Lease a Connection from a Pool for a Block of Work ---
+@asynccontextmanager
+async def lease_pool_connection(db_pool):
+    db = LazyDBConnection(db_pool)
+    try:
+        yield db
+    finally:
+        await db.release()
+
 # --- Lease Connection from Database Pool ---
+# Endpoints depend on this with scope="function" and release the connection themselves after their
+# last query, FastAPI only exits the dependency once the response has been serialised
 async def lease_db_connection(request: Request):
-    async with request.app.state.db_pool.acquire() as connection:
-        yield connection
+    async with lease_pool_connection(request.app.state.db_pool) as db:
+        yield db
+
+# --- Find the Shard Pool Holding a User's Carts and Orders ---
+def get_user_shard_pool(app: FastAPI, user_id: int):
+    return app.state.shard_pools[user_id % len(app.state.shard_pools)]
+
+# --- Find the Shard Pool Holding an Order ---
+def get_order_shard_pool(app: FastAPI, order_id: int):
+    # Each shard's order ids are interleaved so that order_id % shard count is its index
+    return app.state.shard_pools[order_id % len(app.state.shard_pools)]
 
 # --- Create an Access Token to Return to the User ---
 def create_access_token(key_data: dict, expiration_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRATION_DELTA_MINUTES_NEW)) -> str:
@@ -179,7 +700,7 @@ def decode_access_token(access_token: str) -> dict:
         return {"user_id": user_id, "user_role": user_role}
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+    except JWTError:
         raise HTTPException(status_code=401, detail="Invalid Token")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error Decoding Access Token: {str(e)}")
@@ -192,16 +713,42 @@ def authenticate_password(plaintext_password: str, hashed_password: str) -> bool
 def hash_password(plaintext_password: str) -> str:
     return pwd_context.hash(plaintext_password)
 
-# --- Verify the User is an Admin ---
-async def verify_admin(authorization: str = Header(None)):
+# --- Publish an Event to the Event Stream (Delivered on Commit) ---
+async def publish_event(db, event_type: str, event_data: dict):
+    payload = json.dumps({"event": event_type, **event_data})
+    await db.execute(QUERY_PUBLISH_EVENT, EVENT_CHANNEL, payload)
+
+# --- Build the Column List for a Sparse Fieldset Request ---
+def build_book_columns(fields: Optional[str]) -> str:
+    # No fieldset requested, return the full row
+    if not fields:
+        return "*"
+
+    # Split the comma separated fieldset, preserving order and dropping duplicates
+    requested_fields = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+
+    # Only allow known columns to reach the query (Insecure otherwise)
+    invalid_fields = [field for field in requested_fields if field not in BOOK_SELECTABLE_FIELDS]
+    if invalid_fields or not requested_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid fields requested: {', '.join(invalid_fields)}"
+        )
+
+    return ", ".join(requested_fields)
+
+# --- Verify the User is Signed In ---
+async def verify_user(authorization: str = Header(None)):
     # Check if Authorization Header is present and correctly formated
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=404, detail="Invalid or missing access token")
     
     # Extract access token
     access_token = authorization.split("Bearer ")[1]
-    user = decode_access_token(access_token)
+    return decode_access_token(access_token)
 
+# --- Verify the User is an Admin ---
+async def verify_admin(user=Depends(verify_user)):
     # Confirm user is admin
     if not user['user_role'] == 'admin':
         raise HTTPException(
@@ -211,6 +758,18 @@ async def verify_admin(authorization: str = Header(None)):
     
     return user
 
+# --- Lease Connection from the Requesting User's Shard ---
+async def lease_shard_connection(request: Request, user=Depends(verify_user)):
+    async with lease_pool_connection(get_user_shard_pool(request.app, user['user_id'])) as db:
+        yield db
+
+# --- Lease Connection from the Database Holding an Admin Entry ---
+async def lease_entry_connection(request: Request, entity: str, entity_id: int):
+    # Orders live on the shard their id maps to, everything else in the main database
+    entry_pool = get_order_shard_pool(request.app, entity_id) if entity == "orders" else request.app.state.db_pool
+    async with lease_pool_connection(entry_pool) as db:
+        yield db
+
 
 # ========================================
 # API Endpoints
@@ -218,14 +777,14 @@ async def verify_admin(authorization: str = Header(None)):
 
 # --- Create a New User Account ---
 @app.post("/users")
-async def create_user(user_data: General_User, db=Depends(lease_db_connection)):
+async def create_user(user_data: General_User, db=Depends(lease_db_connection, scope="function")):
     try:
         async with db.transaction():
             result = await db.fetchval(
-                "INSERT INTO users (username, email, password_hash, created_at) "
-                "VALUES ($1, $2, $3, $4) RETURNING user_id",
+                QUERY_CREATE_USER,
                 user_data.user_name, user_data.user_email, hash_password(user_data.user_password), datetime.now(timezone.utc),
             )
+        await db.release()
 
         # Retrieve user id from result
         user_id = result
@@ -264,9 +823,10 @@ async def create_user(user_data: General_User, db=Depends(lease_db_connection)):
     
 # --- Get all User Accounts ---
 @app.get("/users")
-async def get_all_users(user=Depends(verify_admin), db=Depends(lease_db_connection)):
+async def get_all_users(user=Depends(verify_admin), db=Depends(lease_db_connection, scope="function")):
     try:
-        all_users = await db.fetch("SELECT user_id, username, email, role from users ORDER BY user_id ASC")
+        all_users = await db.fetch(QUERY_GET_ALL_USERS)
+        await db.release()
         return {
             "status_code": status.HTTP_200_OK,
             "users": all_users
@@ -289,7 +849,7 @@ async def get_all_users(user=Depends(verify_admin), db=Depends(lease_db_connecti
 
 # --- Login to an Account ---
 @app.post("/login")
-async def login_user(login_data: General_User, db=Depends(lease_db_connection)):
+async def login_user(login_data: General_User, db=Depends(lease_db_connection, scope="function")):
     try:
         #Check if email and password are provided
         if not login_data.user_email or not login_data.user_password:
@@ -299,7 +859,8 @@ async def login_user(login_data: General_User, db=Depends(lease_db_connection)):
             )
 
         # Retrieve the requested user data from the database by email
-        requested_user_data = await db.fetchrow("SELECT * FROM users WHERE email = $1", login_data.user_email)
+        requested_user_data = await db.fetchrow(QUERY_GET_USER_BY_EMAIL, login_data.user_email)
+        await db.release()
         if requested_user_data is None:
             # Don't mention the user doesn't exist (Insecure)
             raise HTTPException(
@@ -343,15 +904,16 @@ async def login_user(login_data: General_User, db=Depends(lease_db_connection)):
 
 # --- Add a New Book to the Store ---
 @app.post("/create/book")
-async def add_book(book_data: Post_Book, user=Depends(verify_admin), db=Depends(lease_db_connection)):
+async def add_book(book_data: Post_Book, user=Depends(verify_admin), db=Depends(lease_db_connection, scope="function")):
     try:
         async with db.transaction():
             result = await db.fetchval(
-                "INSERT INTO books (title, author, description, price, cover_image_url, created_at) "
-                "VALUES ($1, $2, $3, $4, $5, $6) RETURNING book_id",
+                QUERY_CREATE_BOOK,
                 book_data.book_title, book_data.book_author, book_data.book_description,
                 book_data.book_price, book_data.book_cover_image_url, datetime.now(timezone.utc)
             )
+            await publish_event(db, "book_changed", {"book_id": result, "action": "created"})
+        await db.release()
 
         # Retrieve book id from result
         book_id = result
@@ -386,9 +948,11 @@ async def add_book(book_data: Post_Book, user=Depends(verify_admin), db=Depends(
 
 # --- Retrieve All Books in Random Order ---
 @app.get("/books")
-async def get_all_books(db=Depends(lease_db_connection)):
+async def get_all_books(fields: Optional[str] = None, db=Depends(lease_db_connection, scope="function")):
     try:
-        all_books = await db.fetch("SELECT * from books ORDER BY RANDOM()")
+        columns = build_book_columns(fields)
+        all_books = await db.fetch(QUERY_GET_ALL_BOOKS.format(columns=columns))
+        await db.release()
         return {
             "status_code": status.HTTP_200_OK,
             "books": all_books
@@ -400,6 +964,9 @@ async def get_all_books(db=Depends(lease_db_connection)):
             detail=f"Error Getting Books: Database Error ({str(e)})"
         )
 
+    except HTTPException as e:
+        raise e
+
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -408,9 +975,10 @@ async def get_all_books(db=Depends(lease_db_connection)):
 
 # --- Retrieve Specific Book's Data ---
 @app.get("/books/{book_id}")
-async def get_book_by_id(book_id: int, db=Depends(lease_db_connection)):
+async def get_book_by_id(book_id: int, db=Depends(lease_db_connection, scope="function")):
     try:
-        book = await db.fetch("SELECT * from books WHERE book_id = $1", book_id)
+        book = await db.fetch(QUERY_GET_BOOK_BY_ID, book_id)
+        await db.release()
         if book is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -439,12 +1007,14 @@ async def get_book_by_id(book_id: int, db=Depends(lease_db_connection)):
 
 # --- Retrieve Book Data from ID List ---
 @app.post("/books/details")
-async def get_books_by_ids(book_ids: General_IntList, db=Depends(lease_db_connection)):
+async def get_books_by_ids(book_ids: General_IntList, fields: Optional[str] = None, db=Depends(lease_db_connection, scope="function")):
     if not book_ids.int_list:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No book IDs provided")
     
     try:
-        books = await db.fetch("SELECT * FROM books WHERE book_id = ANY($1)", book_ids.int_list)
+        columns = build_book_columns(fields)
+        books = await db.fetch(QUERY_GET_BOOKS_BY_IDS.format(columns=columns), book_ids.int_list)
+        await db.release()
         if len(books) <= 0:
             raise HTTPException(
                 status_code=status.HTTP_204_NO_CONTENT,
@@ -473,32 +1043,20 @@ async def get_books_by_ids(book_ids: General_IntList, db=Depends(lease_db_connec
 
 # --- Update Cart ---
 @app.post("/cart")
-async def update_cart(cart_items: Post_Cart, authorization: str = Header(None), db=Depends(lease_db_connection)):
+async def update_cart(cart_items: Post_Cart, user=Depends(verify_user), db=Depends(lease_shard_connection, scope="function")):
     try:
-        # Check if Authorization Header is present and correctly formated
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=404, detail="Invalid or missing access token")
-        
-        #Extract access token
-        access_token = authorization.split("Bearer ")[1]
-
         # Get requesting user's id
-        user = decode_access_token(access_token)
         user_id = user['user_id']
 
         async with db.transaction():
-            await db.execute("DELETE FROM cart_items WHERE user_id = $1", user_id)
+            await db.execute(QUERY_CLEAR_CART, user_id)
 
             for item in cart_items.cart_items:
                 await db.execute(
-                    """
-                    INSERT INTO cart_items (user_id, book_id, quantity, added_at)
-                    VALUES ($1, $2, $3, $4)
-                    ON CONFLICT (user_id, book_id)
-                    DO UPDATE SET quantity = EXCLUDED.quantity
-                    """,
+                    QUERY_UPSERT_CART_ITEM,
                     user_id, item.book_id, item.book_quantity, datetime.now(timezone.utc)
                 )
+        await db.release()
 
         return {
             "status_code": status.HTTP_200_OK,
@@ -525,23 +1083,14 @@ async def update_cart(cart_items: Post_Cart, authorization: str = Header(None),
 
 # --- Get Cart by User ID ---
 @app.get("/cart")
-async def get_cart(authorization: str = Header(None), db=Depends(lease_db_connection)):
+async def get_cart(user=Depends(verify_user), db=Depends(lease_shard_connection, scope="function")):
     try:
-        # Check if Authorization Header is present and correctly formated
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=404, detail="Invalid or missing access token")
-        
-        #Extract access token
-        access_token = authorization.split("Bearer ")[1]
-
         # Get requesting user's id
-        user = decode_access_token(access_token)
         user_id = user['user_id']
 
-        items = await db.fetch(
-            "SELECT b.book_id, c.quantity FROM cart_items c JOIN books b ON c.book_id = b.book_id WHERE c.user_id = $1",
-            user_id
-        )
+        # Cart items may live on a shard without the books table, so no join, removed books are cleared by remove_entry
+        items = await db.fetch(QUERY_GET_CART, user_id)
+        await db.release()
 
         if not items:
             raise HTTPException(
@@ -568,24 +1117,16 @@ async def get_cart(authorization: str = Header(None), db=Depends(lease_db_connec
 
 ## Checkout Endpoints
 @app.post("/checkout")
-async def checkout(order_data: Post_Order, authorization: str = Header(None), db=Depends(lease_db_connection)):
+async def checkout(order_data: Post_Order, user=Depends(verify_user), db=Depends(lease_db_connection, scope="function"), shard_db=Depends(lease_shard_connection, scope="function")):
     try:
-        # Check if Authorization Header is present and correctly formated
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=404, detail="Invalid or missing access token")
-
-        #Extract access token
-        access_token = authorization.split("Bearer ")[1]
-
         # Get requesting user's id
-        user = decode_access_token(access_token)
         user_id = user['user_id']
 
         delivery_address = json.loads(order_data.order_delivery_address)
         payment_info = json.loads(order_data.order_payment_details)
 
         if order_data.order_payment_method == "gift":
-            response = await db.fetchrow("SELECT balance FROM gift_cards WHERE giftcard_code = $1", payment_info.get('cardCode'))
+            response = await db.fetchrow(QUERY_GET_GIFT_CARD_BALANCE, payment_info.get('cardCode'))
             if response is None:
                 raise HTTPException(
                     status_code=404,
@@ -597,26 +1138,29 @@ async def checkout(order_data: Post_Order, authorization: str = Header(None), db
                     status_code=402,
                     detail="Insufficient Funds"
                 )
-            
+
+        # Unsharded, the shard connection comes from the same pool, so hand this one back before taking it
+        await db.release()
+
         formatted_address = ", ".join(delivery_address.values())
         formatted_payment = ", ".join(payment_info.values())
         print(formatted_address)
         print(formatted_payment)
 
-        async with db.transaction():
-            order_id = await db.fetchval("INSERT INTO orders (user_id, total_amount, order_status, created_at, delivery_address, payment_info) VALUES ($1, $2, 'Pending', $3, $4, $5) RETURNING order_id",
+        # Orders are written to the user's shard, gift cards stay in the main database
+        async with shard_db.transaction():
+            order_id = await shard_db.fetchval(QUERY_CREATE_ORDER,
                 user_id, order_data.order_total_cost, datetime.now(timezone.utc), formatted_address, formatted_payment) 
             
             for item in order_data.order_items:
-                await db.execute(
-                    """
-                    INSERT INTO order_items (order_id, book_id, quantity, unit_price)
-                    VALUES ($1, $2, $3, $4)
-                    """,
+                await shard_db.execute(
+                    QUERY_CREATE_ORDER_ITEM,
                     order_id, item.book_id, item.book_quantity, 0.00
                 )
             
-            await db.execute("DELETE FROM cart_items WHERE user_id = $1", user_id)
+            await shard_db.execute(QUERY_CLEAR_CART, user_id)
+            await publish_event(shard_db, "order_created", {"order_id": order_id, "user_id": user_id, "order_status": "Pending"})
+        await shard_db.release()
 
         return {"message": f"Order Placed Successfully: {order_id}"}
     
@@ -636,20 +1180,13 @@ async def checkout(order_data: Post_Order, authorization: str = Header(None), db
         )
 
 @app.get("/user_orders")
-async def get_user_orders(authorization: str = Header(None), db=Depends(lease_db_connection)):
+async def get_user_orders(user=Depends(verify_user), db=Depends(lease_shard_connection, scope="function")):
     try:
-        # Check if Authorization Header is present and correctly formated
-        if not authorization or not authorization.startswith("Bearer "):
-            raise HTTPException(status_code=404, detail="Invalid or missing access token")
-
-        #Extract access token
-        access_token = authorization.split("Bearer ")[1]
-
         # Get requesting user's id
-        user = decode_access_token(access_token)
         user_id = user['user_id']
 
-        orders = await db.fetch("SELECT *, order_items.book_id, order_items.quantity FROM orders JOIN order_items on orders.order_id = order_items.order_id WHERE orders.user_id = $1", user_id)
+        orders = await db.fetch(QUERY_GET_USER_ORDERS, user_id)
+        await db.release()
 
         grouped_orders = {}
         for order in orders:
@@ -675,9 +1212,15 @@ async def get_user_orders(authorization: str = Header(None), db=Depends(lease_db
     return {"orders": list(grouped_orders.values())}
 
 @app.get("/orders")
-async def get_orders(user=Depends(verify_admin), db=Depends(lease_db_connection)):
+async def get_orders(request: Request, user=Depends(verify_admin)):
     try:
-        orders = await db.fetch("SELECT *, order_items.book_id, order_items.quantity FROM orders JOIN order_items on orders.order_id = order_items.order_id")
+        # Gather every shard's orders in parallel, each already sorted, then merge them into one ordering
+        async def fetch_shard_orders(shard_pool):
+            async with lease_pool_connection(shard_pool) as shard_db:
+                return await shard_db.fetch(QUERY_GET_ALL_ORDERS)
+
+        shard_orders = await asyncio.gather(*(fetch_shard_orders(shard_pool) for shard_pool in request.app.state.shard_pools))
+        orders = list(heapq.merge(*shard_orders, key=lambda order: (order['created_at'], order['order_id'])))
 
         grouped_orders = {}
         for order in orders:
@@ -705,19 +1248,21 @@ async def get_orders(user=Depends(verify_admin), db=Depends(lease_db_connection)
 
 ## Review Endpoints
 @app.post("/reviews/")
-async def create_review(review: Review, db=Depends(lease_db_connection)):
+async def create_review(review: Review, db=Depends(lease_db_connection, scope="function")):
     await db.execute(
-        "INSERT INTO reviews (user_id, book_id, rating, review_text, created_at) VALUES ($1, $2, $3, $4, $5)",
+        QUERY_CREATE_REVIEW,
         review.user_id, review.book_id, review.rating, review.review_text, datetime.now(timezone.utc)
     )
+    await db.release()
     return {"message": "Review added"}
 
 @app.get("/reviews/{book_id}")
-async def get_reviews(book_id: int, db=Depends(lease_db_connection)):
+async def get_reviews(book_id: int, db=Depends(lease_db_connection, scope="function")):
     reviews = await db.fetch(
-        "SELECT u.username, r.rating, r.review_text FROM reviews r JOIN users u ON r.user_id = u.user_id WHERE r.book_id = $1",
+        QUERY_GET_BOOK_REVIEWS,
         book_id
     )
+    await db.release()
     if not reviews:
         raise HTTPException(status_code=404, detail="No reviews found for this book")
     return {"reviews": reviews}
@@ -729,20 +1274,14 @@ async def get_reviews(book_id: int, db=Depends(lease_db_connection)):
 
 # --- Modify Existing Entry ---
 @app.put("/modify/{entity}/{entity_id}")
-async def modify_entry(entity_id: int, entity: str, data: dict, user=Depends(verify_admin), db=Depends(lease_db_connection)):
+async def modify_entry(entity_id: int, entity: str, data: dict, user=Depends(verify_admin), db=Depends(lease_entry_connection, scope="function")):
     try: 
-        table_map = {
-            "books": ("book_id", ["title", "author", "description", "price", "cover_image_url"]),
-            "users": ("user_id", ["username", "email", "role"]),
-            "orders": ("order_id", ["order_status"])
-        }
-
-        if entity not in table_map:
+        if entity not in ENTRY_TABLES:
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
-        id_field, allowed_fields = table_map[entity]
+        id_field, allowed_fields = ENTRY_TABLES[entity]
 
-        existing_entry = await db.fetchrow(f"SELECT * FROM {entity} WHERE {id_field} = $1", entity_id)
+        existing_entry = await db.fetchrow(QUERY_GET_ENTRY.format(entity=entity, id_field=id_field), entity_id)
         if not existing_entry:
             raise HTTPException(status_code=404, detail=f"{entity} not found")
         
@@ -754,7 +1293,13 @@ async def modify_entry(entity_id: int, entity: str, data: dict, user=Depends(ver
         values = list(update_data.values()) + [entity_id]
 
         async with db.transaction():
-            await db.execute(f"UPDATE {entity} SET {fields} WHERE {id_field} = ${len(values)}", *values)
+            await db.execute(QUERY_UPDATE_ENTRY.format(entity=entity, fields=fields, id_field=id_field, id_parameter=len(values)), *values)
+
+            if entity == "orders":
+                await publish_event(db, "order_status_changed", {"order_id": entity_id, "user_id": existing_entry['user_id'], "order_status": update_data['order_status']})
+            elif entity == "books":
+                await publish_event(db, "book_changed", {"book_id": entity_id, "action": "updated"})
+        await db.release()
 
         return {
             "status_code": status.HTTP_200_OK,
@@ -784,19 +1329,35 @@ async def modify_entry(entity_id: int, entity: str, data: dict, user=Depends(ver
     
 # --- Delete Existing Entry ---
 @app.put("/remove/{entity}/{entity_id}")
-async def remove_entry(entity: str, entity_id: int, user=Depends(verify_admin), db=Depends(lease_db_connection)):
+async def remove_entry(entity: str, entity_id: int, request: Request, user=Depends(verify_admin), db=Depends(lease_entry_connection, scope="function")):
     try:
-        accepted_entities = {"books": "book_id", "users": "user_id", "orders": "order_id"}
-        if entity not in accepted_entities:
+        if entity not in ENTRY_TABLES:
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
-        id_field = accepted_entities[entity]
-        existing_entry = await db.fetchrow(f"SELECT * FROM {entity} WHERE {id_field} = $1", entity_id)
+        id_field, _ = ENTRY_TABLES[entity]
+
+        existing_entry = await db.fetchrow(QUERY_GET_ENTRY.format(entity=entity, id_field=id_field), entity_id)
         if not existing_entry:
             raise HTTPException(status_code=404, detail=f"{entity} not found")
         
         async with db.transaction():
-            await db.execute(f"DELETE FROM {entity} WHERE {id_field} = $1", entity_id)
+            await db.execute(QUERY_REMOVE_ENTRY.format(entity=entity, id_field=id_field), entity_id)
+
+            if entity == "books":
+                await publish_event(db, "book_changed", {"book_id": entity_id, "action": "removed"})
+        await db.release()
+
+        # Shard tables have no foreign keys back to the main database, so clear their rows by hand
+        if SHARD_DATABASES and entity == "books":
+            for shard_pool in request.app.state.shard_pools:
+                async with lease_pool_connection(shard_pool) as shard_db:
+                    await shard_db.execute(QUERY_REMOVE_BOOK_FROM_CARTS, entity_id)
+
+        elif SHARD_DATABASES and entity == "users":
+            async with lease_pool_connection(get_user_shard_pool(request.app, entity_id)) as shard_db:
+                async with shard_db.transaction():
+                    await shard_db.execute(QUERY_CLEAR_CART, entity_id)
+                    await shard_db.execute(QUERY_REMOVE_USER_ORDERS, entity_id)
 
         return {
             "status_code": status.HTTP_200_OK,
@@ -824,40 +1385,216 @@ async def remove_entry(entity: str, entity_id: int, user=Depends(verify_admin),
             detail=f"Error Removing Element: {str(e)}"
         )
 
+# --- Upload a Book Cover ---
+@app.post("/covers")
+async def upload_cover(request: Request, cover_image: UploadFile, book_id: Optional[int] = Form(None), user=Depends(verify_admin), db=Depends(lease_db_connection, scope="function")):
+    try:
+        image_bytes = await cover_image.read(COVER_MAX_UPLOAD_BYTES + 1)
+        if not image_bytes or len(image_bytes) > COVER_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error Uploading Cover: Image must be between 1 byte and {COVER_MAX_UPLOAD_BYTES} bytes"
+            )
 
+        # Store under the content hash, identical uploads share one set of assets
+        cover_hash = hashlib.sha256(image_bytes).hexdigest()
+        loop = asyncio.get_running_loop()
+        try:
+            asset_names = await loop.run_in_executor(request.app.state.thumbnail_pool, store_cover_assets, image_bytes, cover_hash)
+        except (ValueError, OSError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error Uploading Cover: Invalid Image ({str(e)})"
+            )
 
-## Random Fun
-words = [
-    "astronaut", "guitar", "elephant", "sunshine", "banana", "ocean", "keyboard", "computer", "vulture",
-    "hippopotamus", "planet", "dream", "innovation", "creativity", "wonderful", "perplexing",
-    "ancient", "mysterious", "endless", "beautiful", "magnificent", "whale", "penguin", "butterfly",
-    "echo", "galaxy", "piano", "river", "cloud", "forest", "mountain", "tiger", "courage", "bravery",
-    "space", "cosmic", "fusion", "solar", "miracle", "random", "delightful", "optimistic", "wonder", "inspiration",
-    "phoenix", "revolution", "heroic", "energy", "universe", "champion", "victory", "wisdom",
-    "paradox", "mystic", "lighthouse", "quantum", "gravity", "philosophy", "ecstasy", "excitement",
-    "futuristic", "cathedral", "kingdom", "paradise", "relaxation",
-    "breeze", "candle", "reliability", "faith", "tornado", "sunset", "horizon", "refuge", "idea", "dreamer",
-    "resilience", "balance", "invincible", "lively", "fate", "confidence", "history", "chaos", "serendipity",
-    "sky", "whisper", "brilliant", "calm", "flutter", "radiance", "rainbow",
-    "harmony", "canvas", "philosophical", "survival", "depth", "abundance", "destination", "flame", "soulful",
-    "radiant", "fascination", "transform", "sunrise", "dawn", "twilight", "triumph", "star",
-    "nostalgia", "rejuvenate", "light", "path", "compassion", "revolutionary", "joyful",
-    "ambition", "confusion", "mystery", "reflection", "mountainous", "breathtaking", "serenity", "thunder",
-    "illusion", "solitude", "vibrant", "seraph", "wilderness", "paradoxical", "monumental", "subtle",
-    "transcend", "melancholy", "elixir", "mystical", "luminous", "harvest", "ambrosia", "valor",
-    "mosaic", "glistening", "brilliance", "fiery", "arcane", "clarity", "puzzle", "mirage",
-    "stratosphere", "vortex", "twist", "reverie", "turbulent", "rebirth", "visionary", "eclipse", "persistence",
-    "optimism", "alchemy", "astounding", "awaken", "journey", "perception", "labyrinth", "endurance", "grace",
-    "delirium", "refine", "freedom", "adventure", "courageous", "whimsy", "epiphany", "outlook", "dynamic", "vigor",
-    "ambitious", "stellar", "majestic", "intrigue", "charisma", "mystify", "momentum", "lullaby",
-    "celestial", "phantasm", "paragon", "unravel", "drift", "splendid", "seraphic", "blissful", "vibrance", "serendipitous",
-    "affinity", "vision", "gleam", "wanderlust", "transcendent",
-    "endeavor", "vivid", "whirlwind", "exhilarate", "intrepid", "vantage", "unique",
-    "glimmer", "infinite", "fractal", "cascading", "illumination", "odyssey", "inspire", "wander",
-    "arise", "starlight", "euphoria", "time", "quintessential", "infinity", "enlighten", "paradigm", "elevate", "gravitational",
-    "reverence", "resonate", "ethereal", "elemental", "soul", "timeless", "wanderer"
+        cover_image_url = f"{COVER_BASE_URL}/{asset_names[0]}"
+
+        # Point the book at the new cover when one is given
+        if book_id is not None:
+            async with db.transaction():
+                updated_book = await db.fetchval(QUERY_UPDATE_BOOK_COVER, cover_image_url, book_id)
+                if updated_book is None:
+                    raise HTTPException(status_code=404, detail="books not found")
+                await publish_event(db, "book_changed", {"book_id": book_id, "action": "updated"})
+            await db.release()
+
+        return {
+            "status_code": status.HTTP_200_OK,
+            "detail": "Cover uploaded successfully",
+            "cover_image_url": cover_image_url,
+            "thumbnail_urls": {width: f"{COVER_BASE_URL}/{asset_name}" for width, asset_name in zip(COVER_THUMBNAIL_WIDTHS, asset_names[1:])}
+        }
+
+    except HTTPException as e:
+        raise e
+
+    except asyncpg.PostgresError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error Uploading Cover: Database Error ({str(e)})"
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error Uploading Cover: {str(e)}"
+        )
+
+# --- List Saved Request Profiles ---
+@app.get("/profiles")
+async def get_profiles(user=Depends(verify_admin)):
+    profile_ids = sorted((profile_file.stem for profile_file in PROFILE_OUTPUT_DIRECTORY.glob("*.folded")), reverse=True)
+    return {
+        "status_code": status.HTTP_200_OK,
+        "profiles": profile_ids
+    }
+
+# --- Download a Saved Request Profile (Folded Stacks) ---
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, user=Depends(verify_admin)):
+    # Only plain profile ids, no paths outside the profile directory
+    profile_path = PROFILE_OUTPUT_DIRECTORY / f"{profile_id}.folded"
+    if not re.fullmatch(r"[\w-]+", profile_id) or not profile_path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return FileResponse(profile_path, media_type="text/plain", filename=profile_path.name)
+
+
+# ========================================
+# API Endpoints - Cover Images
+# ========================================
+
+# --- Serve a Stored Cover or Thumbnail ---
+@app.get("/covers/{asset_name}")
+async def get_cover(asset_name: str):
+    # Only content hashed asset names, no paths outside the cover directory
+    asset_path = COVER_STORAGE_DIRECTORY / asset_name
+    if not re.fullmatch(r"[0-9a-f]{64}(_w\d+)?\.(jpg|png|webp|gif)", asset_name) or not asset_path.is_file():
+        raise HTTPException(status_code=404, detail="Cover not found")
+
+    # FileResponse handles Range requests (Starlette 0.39+). It only hands the file to the server by path
+    # on servers with the ASGI pathsend extension, uvicorn has none and streams it in chunks instead,
+    # so in production the reverse proxy should serve COVER_STORAGE_DIRECTORY directly to get sendfile
+    return FileResponse(asset_path, headers={"Cache-Control": COVER_CACHE_CONTROL})
+
+
+# ========================================
+# API Endpoints - Event Stream
+# ========================================
+
+# --- Stream Order and Catalogue Changes (Server-Sent Events) ---
+@app.get("/events")
+async def stream_events(request: Request, access_token: str):
+    # EventSource can't send headers, so the access token is passed as a query parameter
+    user = decode_access_token(access_token)
+
+    subscriber_queue = asyncio.Queue(maxsize=EVENT_QUEUE_MAX_SIZE)
+
+    async def event_generator():
+        # Subscribe once the response starts streaming, a response that is never iterated would never unsubscribe
+        request.app.state.event_subscribers.add(subscriber_queue)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(subscriber_queue.get(), timeout=EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+
+                event = json.loads(payload)
+
+                # Users only see their own orders, admins see everything
+                if user['user_role'] != 'admin' and 'user_id' in event and event['user_id'] != user['user_id']:
+                    continue
+
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+        finally:
+            request.app.state.event_subscribers.discard(subscriber_queue)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ========================================
+# API Endpoints - Batch
+# ========================================
+
+# --- Read Routes Available to a Batch ---
+# (method, path pattern, requires user, handler(path_params, query_params, body, user, db))
+BATCH_ROUTES = [
+    ("GET", r"/books", False, lambda path_params, query_params, body, user, db: get_all_books(fields=query_params.get("fields"), db=db)),
+    ("GET", r"/books/(?P<book_id>\d+)", False, lambda path_params, query_params, body, user, db: get_book_by_id(int(path_params["book_id"]), db=db)),
+    ("POST", r"/books/details", False, lambda path_params, query_params, body, user, db: get_books_by_ids(General_IntList(**(body or {})), fields=query_params.get("fields"), db=db)),
+    ("GET", r"/cart", True, lambda path_params, query_params, body, user, db: get_cart(user=user, db=db)),
+    ("GET", r"/user_orders", True, lambda path_params, query_params, body, user, db: get_user_orders(user=user, db=db)),
+    ("GET", r"/reviews/(?P<book_id>\d+)", False, lambda path_params, query_params, body, user, db: get_reviews(int(path_params["book_id"]), db=db)),
 ]
 
+# --- Run Several Read Requests in One Round Trip ---
+@app.post("/batch")
+async def run_batch(batch_data: Post_Batch, request: Request, authorization: str = Header(None)):
+    if not batch_data.requests or len(batch_data.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error Running Batch: Between 1 and {BATCH_MAX_REQUESTS} requests are required"
+        )
+
+    # Authenticate once for every sub-request, routes needing a user fail individually without one
+    user_error = None
+    try:
+        user = await verify_user(authorization)
+    except HTTPException as e:
+        user, user_error = None, e
+
+    concurrency_limit = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_sub_request(sub_request: General_BatchRequest) -> dict:
+        split_path = urlsplit(sub_request.path)
+        query_params = {key: values[-1] for key, values in parse_qs(split_path.query).items()}
+
+        for route_method, route_pattern, route_requires_user, route_handler in BATCH_ROUTES:
+            path_match = re.fullmatch(route_pattern, split_path.path)
+            if route_method == sub_request.method.upper() and path_match:
+                break
+        else:
+            return {"status_code": status.HTTP_404_NOT_FOUND, "body": {"detail": "Error Running Batch: Route not available in batch"}}
+
+        try:
+            if route_requires_user and user is None:
+                raise user_error
+
+            # Each sub-request leases its own connection so they can run in parallel,
+            # routes needing a user read carts and orders from that user's shard
+            async with concurrency_limit:
+                sub_request_pool = get_user_shard_pool(request.app, user['user_id']) if route_requires_user else request.app.state.db_pool
+                async with lease_pool_connection(sub_request_pool) as db:
+                    response_body = await route_handler(path_match.groupdict(), query_params, sub_request.body, user, db)
+
+            return {"status_code": status.HTTP_200_OK, "body": response_body}
+
+        except HTTPException as e:
+            return {"status_code": e.status_code, "body": {"detail": e.detail}}
+
+        # A sub-request body that doesn't fit the route's schema, reported the way FastAPI reports a bad request body
+        except ValidationError as e:
+            return {"status_code": 422, "body": {"detail": e.errors(include_url=False, include_context=False)}}
+
+        except Exception as e:
+            return {"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"detail": f"Error Running Batch: {str(e)}"}}
+
+    responses = await asyncio.gather(*(run_sub_request(sub_request) for sub_request in batch_data.requests))
+    return {
+        "status_code": status.HTTP_200_OK,
+        "responses": responses
+    }
+
+
+## Random Fun
+
 @app.get("/random/{word_length}")
 async def fun_random(word_length: int):
     if word_length < 1 or word_length > 20:
@@ -0,0 +1,18 @@
+# ========================================
+# Configuration Values (Shared by the API, Migrations and Seeder)
+# ========================================
+
+# --- Database Connection Values ---
+DB_USER = "postgres"
+DB_PASSWORD = "spark"
+DB_NAME = "frontier_books"
+DB_HOST = "localhost"
+DB_PORT = 5432
+
+# --- Shard Connection Values ---
+# cart_items, orders and order_items are split by user_id across these databases,
+# e.g. [{"host": "localhost", "port": 5433, "database": "frontier_books_shard_0"}, ...]
+# Leave empty to keep everything in the main database above. When turning sharding on,
+# run `frontier_books_migrations.py migrate` then `move-to-shards` with the API stopped.
+# The list can't be reordered or resized afterwards.
+SHARD_DATABASES = []
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from frontier_books_seed import SEED_PASSWORD
+
+
+# ========================================
+# Configuration Values
+# ========================================
+
+# --- Load Test Values ---
+def build_cart(rng, book_count: int) -> dict:
+    return {"cart_items": [{"book_id": rng.randint(1, book_count), "book_quantity": rng.randint(1, 3)} for _ in range(3)]}
+
+def build_order(rng, book_count: int) -> dict:
+    return {
+        "order_items": build_cart(rng, book_count)["cart_items"],
+        "order_total_cost": 30.0,
+        "order_payment_method": "card",
+        "order_payment_details": '{"cardNumber": "4111111111111111"}',
+        "order_delivery_address": '{"street": "1 Main St", "city": "Calgary"}',
+    }
+
+# (weight, method, path template, token to send, json body builder(rng, book count))
+# Tokens are None (no header), "user" (a signed in user), "missing" (no header on a user route) or "invalid".
+# Rejected requests make up about a third of the mix, they are the ones that used to hold a pool connection.
+LOAD_TEST_REQUESTS = [
+    (4, "GET", "/books/{book_id}", None, None),
+    (2, "POST", "/books/details?fields=book_id,title,price", None, lambda rng, book_count: {"int_list": [rng.randint(1, book_count) for _ in range(10)]}),
+    (2, "GET", "/reviews/{book_id}", None, None),
+    (2, "GET", "/cart", "user", None),
+    (1, "POST", "/cart", "user", build_cart),
+    (1, "GET", "/user_orders", "user", None),
+    (3, "POST", "/cart", "invalid", build_cart),
+    (1, "POST", "/cart", "missing", build_cart),
+    (2, "POST", "/checkout", "invalid", build_order),
+]
+INVALID_ACCESS_TOKEN = "not-a-valid-token"
+
+
+# ========================================
+# Load Test
+# ========================================
+
+# --- Sign In the Seeded Users a Client Will Act As ---
+async def sign_in_users(client: httpx.AsyncClient, user_count: int) -> list:
+    access_tokens = []
+    for user_id in range(2, user_count + 2):
+        # /login takes the full General_User schema, only the email and password are checked
+        login_data = {"user_id": user_id, "user_name": "", "user_email": f"user{user_id}@example.com", "user_password": SEED_PASSWORD, "user_role": ""}
+        response = await client.post("/login", json=login_data)
+        response.raise_for_status()
+        access_tokens.append(response.json()["access_token"])
+    return access_tokens
+
+# --- Send Requests Back to Back until the Deadline, Recording Each Latency ---
+async def run_client(client: httpx.AsyncClient, rng: random.Random, access_tokens: list, book_count: int, deadline: float, latencies: dict, errors: list):
+    weights = [request[0] for request in LOAD_TEST_REQUESTS]
+    while time.perf_counter() < deadline:
+        _, method, path_template, token, build_body = rng.choices(LOAD_TEST_REQUESTS, weights)[0]
+        book_id = rng.randint(1, book_count)
+        path = path_template.format(book_id=book_id)
+        headers = {}
+        if token == "user":
+            headers = {"Authorization": f"Bearer {rng.choice(access_tokens)}"}
+        elif token == "invalid":
+            headers = {"Authorization": f"Bearer {INVALID_ACCESS_TOKEN}"}
+        body = build_body(rng, book_count) if build_body else None
+
+        started_at = time.perf_counter()
+        try:
+            response = await client.request(method, path, headers=headers, json=body)
+        except httpx.TransportError as e:
+            # Usually a kept-alive connection the server closed just as it was reused
+            errors.append(type(e).__name__)
+            continue
+        request_name = f"{method} {path_template.split('?')[0]}" + (f" ({token} token)" if token in ("missing", "invalid") else "")
+        latencies.setdefault(request_name, []).append(time.perf_counter() - started_at)
+
+        # 404s are expected for books without reviews and users without orders, and 401/404s for rejected tokens
+        if response.status_code >= 500:
+            errors.append(response.status_code)
+
+async def run_load_test(arguments) -> None:
+    limits = httpx.Limits(max_connections=arguments.concurrency, max_keepalive_connections=arguments.concurrency)
+    async with httpx.AsyncClient(base_url=arguments.url, limits=limits, timeout=30) as client:
+        access_tokens = await sign_in_users(client, arguments.users)
+
+        latencies, errors = {}, []
+        rng = random.Random(arguments.seed)
+        started_at = time.perf_counter()
+        deadline = started_at + arguments.duration
+        await asyncio.gather(*(
+            run_client(client, random.Random(rng.random()), access_tokens, arguments.books, deadline, latencies, errors)
+            for _ in range(arguments.concurrency)
+        ))
+        elapsed = time.perf_counter() - started_at
+
+    all_latencies = [latency for path_latencies in latencies.values() for latency in path_latencies]
+    print(f"{len(all_latencies):,} requests in {elapsed:.1f}s with {arguments.concurrency} clients: {len(all_latencies) / elapsed:,.0f} req/s, {len(errors)} server or connection errors")
+    for request_name, path_latencies in [("all", all_latencies)] + sorted(latencies.items()):
+        quantiles = statistics.quantiles(path_latencies, n=100)
+        print(f"  {request_name:<34} p50 {quantiles[49] * 1000:6.1f}ms  p95 {quantiles[94] * 1000:6.1f}ms  p99 {quantiles[98] * 1000:6.1f}ms")
+
+
+# ========================================
+# Command Line
+# ========================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Frontier Books API throughput and latency against a seeded database")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to send requests for")
+    parser.add_argument("--concurrency", type=int, default=64, help="Clients sending requests at once, well past the API's 10 pool connections")
+    parser.add_argument("--users", type=int, default=20, help="Seeded users to sign in and spread cart and order requests over")
+    parser.add_argument("--books", type=int, default=1_000_000, help="Books in the seeded database")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run_load_test(parser.parse_args()))
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import asyncpg
+from pathlib import Path
+from string import Template
+from typing import List, Optional
+
+from frontier_books_config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, SHARD_DATABASES
+
+
+# ========================================
+# Configuration Values
+# ========================================
+
+# --- Migration Values ---
+MIGRATIONS_DIRECTORY = Path(__file__).parent / "migrations"
+SHARD_MIGRATIONS_DIRECTORY = MIGRATIONS_DIRECTORY / "shard"
+
+# --- Shard Move Values ---
+# COPY chunks buffered between reading from the main database and writing to a shard
+SHARD_MOVE_BUFFERED_CHUNKS = 16
+
+
+# ========================================
+# Migrations
+# ========================================
+
+# --- Apply Every Pending Migration in Version Order ---
+async def apply_migrations(db, migrations_directory: Path = MIGRATIONS_DIRECTORY, template_values: dict = None) -> list:
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    )
+    applied_versions = {row['version'] for row in await db.fetch("SELECT version FROM schema_migrations")}
+
+    newly_applied = []
+    for migration_file in sorted(migrations_directory.glob("*.sql")):
+        version = migration_file.stem
+        if version in applied_versions:
+            continue
+
+        # Per-database values like the shard index are filled in before the migration runs
+        migration_sql = migration_file.read_text()
+        if template_values is not None:
+            migration_sql = Template(migration_sql).substitute(template_values)
+
+        # Each migration is applied and recorded atomically
+        async with db.transaction():
+            await db.execute(migration_sql)
+            await db.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+
+        print(f"Applied Migration: {version}")
+        newly_applied.append(version)
+
+    return newly_applied
+
+# --- Refuse a Shard Whose Recorded Position Doesn't Match SHARD_DATABASES ---
+async def check_shard_settings(shard_db, shard_index: int, shard_count: int) -> None:
+    try:
+        shard_settings = await shard_db.fetchrow("SELECT shard_index, shard_count FROM shard_settings")
+    except asyncpg.UndefinedTableError:
+        shard_settings = None
+
+    if shard_settings is None:
+        raise RuntimeError(f"Shard {shard_index} has no shard settings, apply the shard migrations first")
+
+    if (shard_settings['shard_index'], shard_settings['shard_count']) != (shard_index, shard_count):
+        raise RuntimeError(
+            f"SHARD_DATABASES lists shard {shard_index} of {shard_count}, but that database was set up as "
+            f"shard {shard_settings['shard_index']} of {shard_settings['shard_count']}. Changing the shard list "
+            "would route users to the wrong shard."
+        )
+
+# --- Apply Shard Migrations to Every Shard Database ---
+async def apply_shard_migrations(shard_databases: Optional[List[dict]] = None) -> None:
+    shard_databases = SHARD_DATABASES if shard_databases is None else shard_databases
+    shard_count = len(shard_databases)
+    for shard_index, shard_database in enumerate(shard_databases):
+        shard_db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **shard_database)
+        try:
+            # A shard set up under a different SHARD_DATABASES list is refused before anything runs
+            if await shard_db.fetchval("SELECT to_regclass('shard_settings')") is not None:
+                await check_shard_settings(shard_db, shard_index, shard_count)
+
+            await apply_migrations(shard_db, SHARD_MIGRATIONS_DIRECTORY, {"shard_index": shard_index, "shard_count": shard_count})
+            await check_shard_settings(shard_db, shard_index, shard_count)
+
+            print(f"Shard {shard_index} is up to date.")
+        finally:
+            await shard_db.close()
+
+# ========================================
+# Moving Carts and Orders onto Shards
+# ========================================
+
+# --- Stream a Query's Rows from one Database into a Table in Another ---
+async def copy_query_to_table(source_db, query: str, target_db, table: str) -> None:
+    chunks = asyncio.Queue(maxsize=SHARD_MOVE_BUFFERED_CHUNKS)
+
+    async def read_source():
+        try:
+            await source_db.copy_from_query(query, output=chunks.put, format="binary")
+        finally:
+            await chunks.put(None)
+
+    async def buffered_chunks():
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+
+    source_reader = asyncio.create_task(read_source())
+    try:
+        await target_db.copy_to_table(table, source=buffered_chunks(), format="binary")
+    except BaseException:
+        source_reader.cancel()
+        raise
+    await source_reader
+
+# --- Move One Shard's Carts and Orders out of the Main Database ---
+async def move_shard_rows(db, shard_db, shard_index: int, shard_count: int) -> None:
+    shard_filter = f"user_id % {shard_count} = {shard_index}"
+    await shard_db.execute(
+        "CREATE TEMP TABLE moved_cart_items ON COMMIT DROP AS SELECT user_id, book_id, quantity, added_at FROM cart_items WITH NO DATA;"
+        "CREATE TEMP TABLE moved_orders ON COMMIT DROP AS "
+        "SELECT order_id, user_id, total_amount, order_status, created_at, delivery_address, payment_info FROM orders WITH NO DATA;"
+        "CREATE TEMP TABLE moved_order_items ON COMMIT DROP AS SELECT order_id, book_id, quantity, unit_price FROM order_items WITH NO DATA;"
+    )
+
+    await copy_query_to_table(db, f"SELECT user_id, book_id, quantity, added_at FROM cart_items WHERE {shard_filter}", shard_db, "moved_cart_items")
+    await copy_query_to_table(
+        db,
+        f"SELECT order_id, user_id, total_amount, order_status, created_at, delivery_address, payment_info FROM orders WHERE {shard_filter}",
+        shard_db, "moved_orders"
+    )
+    await copy_query_to_table(
+        db,
+        f"SELECT order_items.order_id, book_id, quantity, unit_price FROM order_items JOIN orders ON orders.order_id = order_items.order_id WHERE orders.{shard_filter}",
+        shard_db, "moved_order_items"
+    )
+
+    # Main database order ids don't follow the shard's interleaving, so every moved order gets a new id from the shard's sequence
+    await shard_db.execute(
+        "CREATE TEMP TABLE moved_order_ids ON COMMIT DROP AS "
+        "SELECT order_id AS old_order_id, nextval('orders_order_id_seq') AS new_order_id FROM moved_orders;"
+        "INSERT INTO cart_items (user_id, book_id, quantity, added_at) SELECT * FROM moved_cart_items ON CONFLICT (user_id, book_id) DO NOTHING;"
+        "INSERT INTO orders (order_id, user_id, total_amount, order_status, created_at, delivery_address, payment_info) "
+        "SELECT new_order_id, user_id, total_amount, order_status, created_at, delivery_address, payment_info "
+        "FROM moved_orders JOIN moved_order_ids ON moved_order_ids.old_order_id = moved_orders.order_id;"
+        "INSERT INTO order_items (order_id, book_id, quantity, unit_price) "
+        "SELECT new_order_id, book_id, quantity, unit_price "
+        "FROM moved_order_items JOIN moved_order_ids ON moved_order_ids.old_order_id = moved_order_items.order_id;"
+    )
+
+    moved_orders = await shard_db.fetchval("SELECT count(*) FROM moved_orders")
+    moved_cart_items = await shard_db.fetchval("SELECT count(*) FROM moved_cart_items")
+    print(f"Shard {shard_index}: Moved {moved_orders:,} orders and {moved_cart_items:,} cart items.")
+
+# --- Move Every Cart and Order from the Main Database onto its User's Shard ---
+async def move_to_shards(db, shard_databases: Optional[List[dict]] = None) -> None:
+    shard_databases = SHARD_DATABASES if shard_databases is None else shard_databases
+    if not shard_databases:
+        raise RuntimeError("SHARD_DATABASES is empty, there are no shards to move carts and orders to")
+
+    shard_count = len(shard_databases)
+    shard_dbs = []
+    try:
+        for shard_database in shard_databases:
+            shard_dbs.append(await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **shard_database))
+
+        async with db.transaction():
+            # Nothing can add carts or orders to the main database while they are moved
+            await db.execute("LOCK TABLE cart_items, orders, order_items IN EXCLUSIVE MODE")
+
+            # Every shard is staged before any commits, so a failure part way leaves them all untouched
+            shard_transactions = []
+            for shard_index, shard_db in enumerate(shard_dbs):
+                await check_shard_settings(shard_db, shard_index, shard_count)
+                shard_transactions.append(shard_db.transaction())
+                await shard_transactions[-1].start()
+                await move_shard_rows(db, shard_db, shard_index, shard_count)
+
+            # Shards commit before the main database deletes, so a failure in between leaves the
+            # rows in both places, to be deleted from the main database by hand, rather than in neither
+            for shard_transaction in shard_transactions:
+                await shard_transaction.commit()
+
+            await db.execute("DELETE FROM cart_items")
+            await db.execute("DELETE FROM orders")
+    finally:
+        # Closing a shard connection rolls back its transaction if it never committed
+        for shard_db in shard_dbs:
+            await shard_db.close()
+
+
+# ========================================
+# Command Line
+# ========================================
+
+async def main(command: str) -> int:
+    db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, database=DB_NAME, host=DB_HOST, port=DB_PORT)
+    try:
+        if command == "move-to-shards":
+            await move_to_shards(db)
+            return 0
+
+        newly_applied = await apply_migrations(db)
+        if not newly_applied:
+            print("Database is up to date.")
+        await apply_shard_migrations()
+        return 0
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frontier Books schema migrations")
+    parser.add_argument(
+        "command", choices=["migrate", "move-to-shards"], nargs="?", default="migrate",
+        help="move-to-shards moves existing carts and orders onto their user's shard, renumbering orders, run it once with the API stopped"
+    )
+    raise SystemExit(asyncio.run(main(parser.parse_args().command)))
@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import asyncpg
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import io
+from passlib.context import CryptContext
+import random
+import time
+from typing import List, Optional
+
+from frontier_books_config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT, SHARD_DATABASES
+from frontier_books_words import words
+from frontier_books_migrations import apply_migrations, apply_shard_migrations
+
+
+# ========================================
+# Configuration Values
+# ========================================
+
+# --- Seeding Values ---
+SEED_PASSWORD = "password"
+SEED_START_DATETIME = datetime(2023, 1, 1, tzinfo=timezone.utc)
+SEED_HISTORY_DAYS = 730
+ORDER_STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+ORDER_STATUS_WEIGHTS = [5, 5, 10, 75, 5]
+REVIEW_RATING_WEIGHTS = [5, 7, 15, 33, 40]
+
+# Larger values concentrate more orders, carts and reviews on the first (most popular) ids
+POPULARITY_SKEW = 3.0
+
+# --- Table Columns (COPY Order) ---
+TABLE_COLUMNS = {
+    "users": ["user_id", "username", "email", "password_hash", "role", "created_at"],
+    "books": ["book_id", "title", "author", "description", "price", "cover_image_url", "created_at"],
+    "gift_cards": ["giftcard_code", "balance"],
+    "cart_items": ["user_id", "book_id", "quantity", "added_at"],
+    "orders": ["order_id", "user_id", "total_amount", "order_status", "created_at", "delivery_address", "payment_info"],
+    "order_items": ["order_id", "book_id", "quantity", "unit_price"],
+    "reviews": ["user_id", "book_id", "rating", "review_text", "created_at"],
+}
+
+# Tables split by user_id across SHARD_DATABASES, loaded into the main database when unsharded
+SHARD_TABLES = ["cart_items", "orders", "order_items"]
+
+# Tables with SERIAL ids that are loaded explicitly and need their sequence moved past the data
+SERIAL_COLUMNS = {"users": "user_id", "books": "book_id", "orders": "order_id"}
+
+
+# ========================================
+# Row Generators (Run in Worker Processes)
+# ========================================
+
+# --- Deterministic Random Source for One Chunk ---
+def chunk_rng(seed: int, table: str, chunk_start: int) -> random.Random:
+    # Seeding per chunk keeps output identical regardless of worker count or scheduling
+    return random.Random(f"{seed}:{table}:{chunk_start}")
+
+# --- Pick a Popularity-Skewed Id in [1, count] ---
+def skewed_id(rng: random.Random, count: int) -> int:
+    return int(count * rng.random() ** POPULARITY_SKEW) + 1
+
+# --- Random Timestamp within the Seeded History ---
+def random_datetime(rng: random.Random) -> datetime:
+    return SEED_START_DATETIME + timedelta(seconds=rng.randrange(SEED_HISTORY_DAYS * 86400))
+
+# --- Random Sentence from the Shared Word List ---
+def random_sentence(rng: random.Random, word_count: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(word_count)).capitalize()
+
+# --- Serialise Rows to CSV Bytes for COPY ---
+def rows_to_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+# --- Split Rows by Shard (Shard Key % Shard Count) into one CSV per Shard ---
+def rows_to_shard_csvs(rows, shard_count: int, shard_key_index: int) -> List[bytes]:
+    shard_rows = [[] for _ in range(shard_count)]
+    for row in rows:
+        shard_rows[row[shard_key_index] % shard_count].append(row)
+    return [rows_to_csv(rows) for rows in shard_rows]
+
+# --- Book Price Lookup Shared by Orders and Order Items ---
+def book_price(book_id: int) -> float:
+    return round(5 + (book_id * 7919 % 4500) / 100, 2)
+
+def generate_users(seed: int, chunk_start: int, chunk_end: int, password_hash: str) -> dict:
+    rng = chunk_rng(seed, "users", chunk_start)
+    rows = []
+    for user_id in range(chunk_start, chunk_end):
+        role = "admin" if user_id == 1 else "user"
+        rows.append((user_id, f"{rng.choice(words)}_{user_id}", f"user{user_id}@example.com", password_hash, role, random_datetime(rng).isoformat()))
+    return {"users": [rows_to_csv(rows)]}
+
+def generate_books(seed: int, chunk_start: int, chunk_end: int) -> dict:
+    rng = chunk_rng(seed, "books", chunk_start)
+    rows = []
+    for book_id in range(chunk_start, chunk_end):
+        rows.append((
+            book_id,
+            random_sentence(rng, rng.randint(1, 5)),
+            f"{rng.choice(words).capitalize()} {rng.choice(words).capitalize()}",
+            random_sentence(rng, rng.randint(20, 120)) + ".",
+            book_price(book_id),
+            f"https://picsum.photos/seed/{book_id}/400/600",
+            random_datetime(rng).isoformat(),
+        ))
+    return {"books": [rows_to_csv(rows)]}
+
+def generate_gift_cards(seed: int, chunk_start: int, chunk_end: int) -> dict:
+    rng = chunk_rng(seed, "gift_cards", chunk_start)
+    rows = [(f"GIFT-{code:08d}", rng.choice([10, 25, 50, 100, 250])) for code in range(chunk_start, chunk_end)]
+    return {"gift_cards": [rows_to_csv(rows)]}
+
+def generate_carts(seed: int, chunk_start: int, chunk_end: int, book_count: int, shard_count: int) -> dict:
+    rng = chunk_rng(seed, "cart_items", chunk_start)
+    rows = []
+    for user_id in range(chunk_start, chunk_end):
+        # Roughly a third of users have something in their cart
+        if rng.random() > 0.3:
+            continue
+
+        cart_book_ids = {skewed_id(rng, book_count) for _ in range(rng.randint(1, 6))}
+        for book_id in cart_book_ids:
+            rows.append((user_id, book_id, rng.randint(1, 3), random_datetime(rng).isoformat()))
+    return {"cart_items": rows_to_shard_csvs(rows, shard_count, 0)}
+
+def generate_orders(seed: int, chunk_start: int, chunk_end: int, user_count: int, book_count: int, shard_count: int) -> dict:
+    rng = chunk_rng(seed, "orders", chunk_start)
+    order_rows = []
+    item_rows = []
+    for order_id in range(chunk_start, chunk_end):
+        order_book_ids = {skewed_id(rng, book_count) for _ in range(rng.randint(1, 5))}
+
+        total_amount = 0.0
+        for book_id in order_book_ids:
+            quantity = rng.randint(1, 3)
+            total_amount += book_price(book_id) * quantity
+            item_rows.append((order_id, book_id, quantity, book_price(book_id)))
+
+        # Order ids are interleaved across shards, so the order goes to a nearby user on its id's shard
+        user_id = skewed_id(rng, user_count)
+        user_id -= (user_id - order_id) % shard_count
+        if user_id < 1:
+            user_id += shard_count
+
+        order_rows.append((
+            order_id,
+            user_id,
+            round(total_amount, 2),
+            rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            random_datetime(rng).isoformat(),
+            f"{rng.randint(1, 9999)} {rng.choice(words).capitalize()} Street, Calgary, AB",
+            "card, ****" + f"{rng.randint(0, 9999):04d}",
+        ))
+    return {"orders": rows_to_shard_csvs(order_rows, shard_count, 0), "order_items": rows_to_shard_csvs(item_rows, shard_count, 0)}
+
+def generate_reviews(seed: int, chunk_start: int, chunk_end: int, user_count: int, book_count: int) -> dict:
+    rng = chunk_rng(seed, "reviews", chunk_start)
+    rows = []
+    for _ in range(chunk_start, chunk_end):
+        rows.append((
+            rng.randint(1, user_count),
+            skewed_id(rng, book_count),
+            rng.choices([1, 2, 3, 4, 5], REVIEW_RATING_WEIGHTS)[0],
+            random_sentence(rng, rng.randint(5, 60)) + ".",
+            random_datetime(rng).isoformat(),
+        ))
+    return {"reviews": [rows_to_csv(rows)]}
+
+
+# ========================================
+# Loading
+# ========================================
+
+# --- Drop Secondary Indexes and Foreign Keys, Returning the Statements that Restore Them ---
+async def drop_load_constraints(db, tables: List[str]) -> List[str]:
+    # Primary keys stay, every other index and foreign key would be maintained or checked per copied row
+    foreign_keys = await db.fetch(
+        "SELECT conrelid::regclass::text AS table_name, conname, pg_get_constraintdef(oid) AS definition "
+        "FROM pg_constraint WHERE contype = 'f' AND conrelid::regclass::text = ANY($1)",
+        tables
+    )
+    indexes = await db.fetch(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = ANY($1) "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE contype IN ('p', 'u'))",
+        tables
+    )
+
+    async with db.transaction():
+        for foreign_key in foreign_keys:
+            await db.execute(f"ALTER TABLE {foreign_key['table_name']} DROP CONSTRAINT {foreign_key['conname']}")
+        for index in indexes:
+            await db.execute(f"DROP INDEX {index['indexname']}")
+
+    # Indexes first, so foreign key validation can use them
+    return [index['indexdef'] for index in indexes] + [
+        f"ALTER TABLE {foreign_key['table_name']} ADD CONSTRAINT {foreign_key['conname']} {foreign_key['definition']}"
+        for foreign_key in foreign_keys
+    ]
+
+# --- Generate Chunks in the Process Pool and COPY each as it Completes ---
+# Generators return one CSV per pool in db_pools for every table
+async def load_table(db_pools, process_pool, chunk_limit, generator, seed: int, row_count: int, chunk_size: int, *generator_args):
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+
+    async def load_chunk(chunk_start: int):
+        chunk_end = min(chunk_start + chunk_size, row_count + 1)
+
+        # Bounds chunks in flight, so generated CSVs never pile up waiting for a COPY stream
+        async with chunk_limit:
+            table_csvs = await loop.run_in_executor(process_pool, generator, seed, chunk_start, chunk_end, *generator_args)
+
+            for pool_index, db_pool in enumerate(db_pools):
+                async with db_pool.acquire() as db:
+                    for table, csvs in table_csvs.items():
+                        await db.copy_to_table(table, source=io.BytesIO(csvs[pool_index]), columns=TABLE_COLUMNS[table], format="csv")
+
+    await asyncio.gather(*(load_chunk(chunk_start) for chunk_start in range(1, row_count + 1, chunk_size)))
+    print(f"Loaded {generator.__name__.removeprefix('generate_')}: {row_count:,} in {time.perf_counter() - started_at:.1f}s")
+
+async def create_seed_pool(workers: int, database: dict):
+    return await asyncpg.create_pool(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        min_size=workers,
+        max_size=workers,
+        # Losing the tail of a seeding run on a crash is fine, waiting on every commit's flush is not
+        server_settings={"synchronous_commit": "off"},
+        **database
+    )
+
+async def seed_database(arguments, database: Optional[dict] = None, shard_databases: Optional[List[dict]] = None) -> None:
+    database = database or {"host": DB_HOST, "port": DB_PORT, "database": DB_NAME}
+    shard_databases = SHARD_DATABASES if shard_databases is None else shard_databases
+
+    db_pool = await create_seed_pool(arguments.workers, database)
+    shard_pools = []
+    try:
+        for shard_database in shard_databases:
+            shard_pools.append(await create_seed_pool(arguments.workers, shard_database))
+
+        # Carts and orders go to the user's shard, or stay in the main database when unsharded
+        user_table_pools = shard_pools or [db_pool]
+        main_tables = [table for table in TABLE_COLUMNS if not shard_pools or table not in SHARD_TABLES]
+
+        async with db_pool.acquire() as db:
+            await apply_migrations(db)
+        await apply_shard_migrations(shard_databases)
+
+        restore_statements = []
+        for target_pool, target_tables in [(db_pool, main_tables)] + [(shard_pool, SHARD_TABLES) for shard_pool in shard_pools]:
+            async with target_pool.acquire() as db:
+                if arguments.truncate:
+                    await db.execute(f"TRUNCATE {', '.join(target_tables)} RESTART IDENTITY CASCADE")
+                restore_statements.append((target_pool, await drop_load_constraints(db, target_tables)))
+
+        # Every seeded user shares one hash, bcrypt per row would dominate the run time
+        password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(SEED_PASSWORD)
+        seed = arguments.seed
+        chunk_size = arguments.chunk_size
+        chunk_limit = asyncio.Semaphore(arguments.workers * 2)
+        shard_count = len(user_table_pools)
+
+        try:
+            with ProcessPoolExecutor(max_workers=arguments.workers) as process_pool:
+                # No foreign keys during the load, so every table loads at once
+                await asyncio.gather(
+                    load_table([db_pool], process_pool, chunk_limit, generate_users, seed, arguments.users, chunk_size, password_hash),
+                    load_table([db_pool], process_pool, chunk_limit, generate_books, seed, arguments.books, chunk_size),
+                    load_table([db_pool], process_pool, chunk_limit, generate_gift_cards, seed, arguments.gift_cards, chunk_size),
+                    load_table(user_table_pools, process_pool, chunk_limit, generate_carts, seed, arguments.users, chunk_size, arguments.books, shard_count),
+                    load_table(user_table_pools, process_pool, chunk_limit, generate_orders, seed, arguments.orders, chunk_size, arguments.users, arguments.books, shard_count),
+                    load_table([db_pool], process_pool, chunk_limit, generate_reviews, seed, arguments.reviews, chunk_size, arguments.users, arguments.books),
+                )
+        finally:
+            # Restored even when the load fails, so the schema is never left without its indexes
+            started_at = time.perf_counter()
+            for target_pool, target_restore_statements in restore_statements:
+                async with target_pool.acquire() as db:
+                    for restore_statement in target_restore_statements:
+                        await db.execute(restore_statement)
+            print(f"Rebuilt Indexes and Foreign Keys in {time.perf_counter() - started_at:.1f}s")
+
+        async with db_pool.acquire() as db:
+            for table, id_field in SERIAL_COLUMNS.items():
+                await db.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{id_field}'), COALESCE(MAX({id_field}), 0) + 1, false) FROM {table}")
+            await db.execute(f"ANALYZE {', '.join(main_tables)}")
+
+        for shard_index, shard_pool in enumerate(shard_pools):
+            async with shard_pool.acquire() as db:
+                # Next id above the seeded orders that maps back to this shard, as shard migration 0002 sets it
+                await db.execute(
+                    "SELECT setval('orders_order_id_seq', max_order_id + 1 + (($1 - (max_order_id + 1)) % $2 + $2) % $2, false) "
+                    "FROM (SELECT COALESCE(MAX(order_id), 0) AS max_order_id FROM orders) AS existing_orders",
+                    shard_index, shard_count
+                )
+                await db.execute(f"ANALYZE {', '.join(SHARD_TABLES)}")
+    finally:
+        for shard_pool in shard_pools:
+            await shard_pool.close()
+        await db_pool.close()
+
+
+# ========================================
+# Command Line
+# ========================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic Frontier Books dataset for scale testing")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--reviews", type=int, default=500_000)
+    parser.add_argument("--gift-cards", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=8, help="Parallel generator processes and COPY streams")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Rows generated and copied per stream")
+    parser.add_argument("--truncate", action="store_true", help="Empty every table before seeding")
+
+    started_at = time.perf_counter()
+    asyncio.run(seed_database(parser.parse_args()))
+    print(f"Seeding Complete in {time.perf_counter() - started_at:.1f}s")
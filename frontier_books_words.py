@@ -0,0 +1,31 @@
+# Word list shared by /random and the dataset generator
+words = [
+    "astronaut", "guitar", "elephant", "sunshine", "banana", "ocean", "keyboard", "computer", "vulture",
+    "hippopotamus", "planet", "dream", "innovation", "creativity", "wonderful", "perplexing",
+    "ancient", "mysterious", "endless", "beautiful", "magnificent", "whale", "penguin", "butterfly",
+    "echo", "galaxy", "piano", "river", "cloud", "forest", "mountain", "tiger", "courage", "bravery",
+    "space", "cosmic", "fusion", "solar", "miracle", "random", "delightful", "optimistic", "wonder", "inspiration",
+    "phoenix", "revolution", "heroic", "energy", "universe", "champion", "victory", "wisdom",
+    "paradox", "mystic", "lighthouse", "quantum", "gravity", "philosophy", "ecstasy", "excitement",
+    "futuristic", "cathedral", "kingdom", "paradise", "relaxation",
+    "breeze", "candle", "reliability", "faith", "tornado", "sunset", "horizon", "refuge", "idea", "dreamer",
+    "resilience", "balance", "invincible", "lively", "fate", "confidence", "history", "chaos", "serendipity",
+    "sky", "whisper", "brilliant", "calm", "flutter", "radiance", "rainbow",
+    "harmony", "canvas", "philosophical", "survival", "depth", "abundance", "destination", "flame", "soulful",
+    "radiant", "fascination", "transform", "sunrise", "dawn", "twilight", "triumph", "star",
+    "nostalgia", "rejuvenate", "light", "path", "compassion", "revolutionary", "joyful",
+    "ambition", "confusion", "mystery", "reflection", "mountainous", "breathtaking", "serenity", "thunder",
+    "illusion", "solitude", "vibrant", "seraph", "wilderness", "paradoxical", "monumental", "subtle",
+    "transcend", "melancholy", "elixir", "mystical", "luminous", "harvest", "ambrosia", "valor",
+    "mosaic", "glistening", "brilliance", "fiery", "arcane", "clarity", "puzzle", "mirage",
+    "stratosphere", "vortex", "twist", "reverie", "turbulent", "rebirth", "visionary", "eclipse", "persistence",
+    "optimism", "alchemy", "astounding", "awaken", "journey", "perception", "labyrinth", "endurance", "grace",
+    "delirium", "refine", "freedom", "adventure", "courageous", "whimsy", "epiphany", "outlook", "dynamic", "vigor",
+    "ambitious", "stellar", "majestic", "intrigue", "charisma", "mystify", "momentum", "lullaby",
+    "celestial", "phantasm", "paragon", "unravel", "drift", "splendid", "seraphic", "blissful", "vibrance", "serendipitous",
+    "affinity", "vision", "gleam", "wanderlust", "transcendent",
+    "endeavor", "vivid", "whirlwind", "exhilarate", "intrepid", "vantage", "unique",
+    "glimmer", "infinite", "fractal", "cascading", "illumination", "odyssey", "inspire", "wander",
+    "arise", "starlight", "euphoria", "time", "quintessential", "infinity", "enlighten", "paradigm", "elevate", "gravitational",
+    "reverence", "resonate", "ethereal", "elemental", "soul", "timeless", "wanderer"
+]
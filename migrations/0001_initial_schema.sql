@@ -0,0 +1,64 @@
+-- ========================================
+-- 0001: Initial Schema
+-- ========================================
+-- Tables as used by frontier_books_api.py. IF NOT EXISTS lets this run
+-- against databases created before migrations were tracked.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id SERIAL PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS books (
+    book_id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    price DOUBLE PRECISION NOT NULL,
+    cover_image_url TEXT NOT NULL DEFAULT '',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL REFERENCES books (book_id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    added_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, book_id)
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    total_amount DOUBLE PRECISION NOT NULL,
+    order_status TEXT NOT NULL DEFAULT 'Pending',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    delivery_address TEXT NOT NULL,
+    payment_info TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_item_id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders (order_id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL REFERENCES books (book_id),
+    quantity INTEGER NOT NULL,
+    unit_price DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL REFERENCES books (book_id) ON DELETE CASCADE,
+    rating INTEGER NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    review_text TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS gift_cards (
+    giftcard_code TEXT PRIMARY KEY,
+    balance DOUBLE PRECISION NOT NULL
+);
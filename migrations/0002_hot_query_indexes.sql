@@ -0,0 +1,18 @@
+-- ========================================
+-- 0002: Indexes for Hot Queries
+-- ========================================
+
+-- login_user, create_user (duplicate emails)
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_idx ON users (email);
+
+-- get_cart, update_cart, checkout are served by the cart_items (user_id, book_id)
+-- primary key, which ON CONFLICT in update_cart already depends on
+
+-- get_user_orders, get_orders
+CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);
+
+-- get_user_orders
+CREATE INDEX IF NOT EXISTS orders_user_id_created_at_idx ON orders (user_id, created_at);
+
+-- get_reviews
+CREATE INDEX IF NOT EXISTS reviews_book_id_idx ON reviews (book_id);
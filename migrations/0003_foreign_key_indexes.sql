@@ -0,0 +1,13 @@
+-- ========================================
+-- 0003: Indexes for Lookups by Book and User
+-- ========================================
+
+-- remove_entry (books), clearing a removed book from every cart, and the
+-- cart_items ON DELETE CASCADE from books
+CREATE INDEX IF NOT EXISTS cart_items_book_id_idx ON cart_items (book_id);
+
+-- order_items ON DELETE SET NULL from books
+CREATE INDEX IF NOT EXISTS order_items_book_id_idx ON order_items (book_id);
+
+-- reviews ON DELETE CASCADE from users
+CREATE INDEX IF NOT EXISTS reviews_user_id_idx ON reviews (user_id);
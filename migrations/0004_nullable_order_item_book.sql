@@ -0,0 +1,12 @@
+-- ========================================
+-- 0004: Keep Order Lines When a Book is Removed
+-- ========================================
+-- order_items.book_id referenced books with no ON DELETE action, so removing
+-- a book that had ever been ordered failed. Past orders keep their lines,
+-- quantities and prices, the lines just lose the book reference.
+
+ALTER TABLE order_items ALTER COLUMN book_id DROP NOT NULL;
+
+ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_book_id_fkey;
+ALTER TABLE order_items ADD CONSTRAINT order_items_book_id_fkey
+    FOREIGN KEY (book_id) REFERENCES books (book_id) ON DELETE SET NULL;
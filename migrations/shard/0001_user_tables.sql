@@ -0,0 +1,38 @@
+-- ========================================
+-- Shard 0001: Per-User Tables
+-- ========================================
+-- Tables split by user_id across SHARD_DATABASES. users and books stay in the
+-- main database, so there are no foreign keys back to them here.
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    user_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    added_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, book_id)
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    total_amount DOUBLE PRECISION NOT NULL,
+    order_status TEXT NOT NULL DEFAULT 'Pending',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    delivery_address TEXT NOT NULL,
+    payment_info TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_item_id SERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders (order_id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price DOUBLE PRECISION NOT NULL
+);
+
+-- get_user_orders
+CREATE INDEX IF NOT EXISTS orders_user_id_created_at_idx ON orders (user_id, created_at);
+CREATE INDEX IF NOT EXISTS order_items_order_id_idx ON order_items (order_id);
+
+-- remove_entry clearing a removed book from every shard's carts
+CREATE INDEX IF NOT EXISTS cart_items_book_id_idx ON cart_items (book_id);
@@ -0,0 +1,25 @@
+-- ========================================
+-- Shard 0002: Shard Position and Interleaved Order Ids
+-- ========================================
+-- ${shard_index} and ${shard_count} are filled in per shard by apply_shard_migrations.
+
+-- Which shard this database is, checked by the migration runner and at API startup
+-- so a changed SHARD_DATABASES list can't route users to the wrong shard
+CREATE TABLE IF NOT EXISTS shard_settings (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    shard_index INTEGER NOT NULL,
+    shard_count INTEGER NOT NULL
+);
+
+INSERT INTO shard_settings (shard_index, shard_count) VALUES (${shard_index}, ${shard_count});
+
+-- Interleave order ids so that order_id % shard count always points back to this shard,
+-- continuing from the first such id above any orders already here
+ALTER SEQUENCE orders_order_id_seq INCREMENT BY ${shard_count};
+
+SELECT setval(
+    'orders_order_id_seq',
+    max_order_id + 1 + ((${shard_index} - (max_order_id + 1)) % ${shard_count} + ${shard_count}) % ${shard_count},
+    false
+)
+FROM (SELECT COALESCE(MAX(order_id), 0) AS max_order_id FROM orders) AS existing_orders;
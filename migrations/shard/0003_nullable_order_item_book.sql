@@ -0,0 +1,7 @@
+-- ========================================
+-- Shard 0003: Order Lines Without a Book
+-- ========================================
+-- Matches order_items in the main database, where removing a book sets the
+-- line's book_id to NULL. Lines moved off the main database can carry that NULL.
+
+ALTER TABLE order_items ALTER COLUMN book_id DROP NOT NULL;
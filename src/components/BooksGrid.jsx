@@ -3,6 +3,9 @@ import styles from '../css/PageHome.module.css'
 import { CartContext } from "../services/CartContext"
 import BookDialog from "./BookDialog";
 
+// Uploaded covers come with pre-generated thumbnails, other URLs are used as-is
+const thumbnailUrl = (url) => url.includes("/frontier_books/covers/") ? url.replace(/\.\w+$/, "_w400.webp") : url;
+
 const BooksGrid = ({ books }) => {
     const [selectedBook, setSelectedBook] = useState(null);
     const { isCartSaved, saveLocalCart, addToCart } = useContext(CartContext);
@@ -12,7 +15,7 @@ const BooksGrid = ({ books }) => {
             <section className={styles.product_list}>
                 {books.map((book, index) => (
                     <article key={index} className={styles.product_item}>
-                        <img className={styles.product_image} src={book.cover_image_url} alt={book.title} onClick={() => {setSelectedBook(book);}}></img>
+                        <img className={styles.product_image} src={thumbnailUrl(book.cover_image_url)} alt={book.title} onClick={() => {setSelectedBook(book);}}></img>
                         <p className={styles.book_title}>{book.title}</p>
                         <p className={styles.book_author}>by: {book.author}</p>
                         <div>
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from frontier_books_api import BATCH_MAX_REQUESTS, app, create_access_token
+
+
+# --- Stand-in for an asyncpg Pool whose Queries Return Fixed Rows ---
+class FakeConnection:
+    async def fetch(self, query, *args):
+        if "FROM cart_items" in query:
+            return [{"book_id": 7, "quantity": 2}]
+        return [{"book_id": args[0], "title": "Sample"}]
+
+
+class FakePool:
+    async def acquire(self):
+        return FakeConnection()
+
+    async def release(self, connection):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No lifespan, the batch only needs pools to lease connections from
+    monkeypatch.setattr(app.state, "db_pool", FakePool(), raising=False)
+    monkeypatch.setattr(app.state, "shard_pools", [app.state.db_pool], raising=False)
+    return TestClient(app)
+
+
+def run_batch(client, requests, headers=None):
+    response = client.post("/batch", json={"requests": requests}, headers=headers or {})
+    assert response.status_code == 200
+    return response.json()["responses"]
+
+
+def test_sub_requests_answer_in_order(client):
+    responses = run_batch(client, [{"path": "/books/3"}, {"path": "/books/5"}])
+    assert [response["body"]["book"][0]["book_id"] for response in responses] == [3, 5]
+    assert all(response["status_code"] == 200 for response in responses)
+
+
+def test_invalid_sub_request_body_is_unprocessable(client):
+    responses = run_batch(client, [
+        {"method": "POST", "path": "/books/details", "body": {"int_list": "not a list"}},
+        {"path": "/books/3"},
+    ])
+    assert responses[0]["status_code"] == 422
+    assert responses[0]["body"]["detail"][0]["loc"] == ["int_list"]
+    assert responses[1]["status_code"] == 200
+
+
+def test_unknown_route_is_not_found(client):
+    responses = run_batch(client, [{"method": "DELETE", "path": "/books/3"}, {"path": "/users"}])
+    assert [response["status_code"] for response in responses] == [404, 404]
+
+
+def test_user_routes_need_a_signed_in_user(client):
+    # Same answer as GET /cart without a token
+    assert run_batch(client, [{"path": "/cart"}])[0] == {"status_code": 404, "body": {"detail": "Invalid or missing access token"}}
+
+    access_token = create_access_token(key_data={"user_id": 4, "user_role": "user"})
+    responses = run_batch(client, [{"path": "/cart"}], headers={"Authorization": f"Bearer {access_token}"})
+    assert responses[0] == {"status_code": 200, "body": {"cart_items": [{"book_id": 7, "quantity": 2}]}}
+
+
+@pytest.mark.parametrize("request_count", [0, BATCH_MAX_REQUESTS + 1])
+def test_batch_size_is_limited(client, request_count):
+    response = client.post("/batch", json={"requests": [{"path": "/books/1"}] * request_count})
+    assert response.status_code == 400
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from frontier_books_api import BOOK_SELECTABLE_FIELDS, build_book_columns, get_all_books
+
+
+# --- Records the SQL a Handler Sends ---
+class RecordingDB:
+    def __init__(self):
+        self.queries = []
+
+    async def fetch(self, query, *args):
+        self.queries.append(query)
+        return []
+
+    async def release(self):
+        pass
+
+
+def test_no_fieldset_selects_full_row():
+    assert build_book_columns(None) == "*"
+    assert build_book_columns("") == "*"
+
+
+def test_fieldset_keeps_order_and_drops_duplicates():
+    assert build_book_columns(" title, book_id,title ,price") == "title, book_id, price"
+
+
+def test_every_selectable_field_is_accepted():
+    assert build_book_columns(",".join(BOOK_SELECTABLE_FIELDS)) == ", ".join(BOOK_SELECTABLE_FIELDS)
+
+
+@pytest.mark.parametrize("fields", ["title,password_hash", "book_id; DROP TABLE books", ",", " , "])
+def test_unknown_or_empty_fields_are_rejected(fields):
+    with pytest.raises(HTTPException) as error:
+        build_book_columns(fields)
+    assert error.value.status_code == 400
+
+
+def test_fieldset_is_projected_in_sql():
+    db = RecordingDB()
+    asyncio.run(get_all_books(fields="book_id,title", db=db))
+    assert db.queries == ["SELECT book_id, title from books ORDER BY RANDOM()"]
+
+
+def test_invalid_fieldset_is_a_400_not_a_500():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_all_books(fields="nope", db=RecordingDB()))
+    assert error.value.status_code == 400
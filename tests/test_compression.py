@@ -0,0 +1,90 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from frontier_books_api import SelectiveGZipMiddleware
+
+
+def build_client(minimum_size: int = 100) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(SelectiveGZipMiddleware, minimum_size=minimum_size, compresslevel=6, excluded_content_types=["text/event-stream", "image/"])
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("x")
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse((f"chunk {index}\n" * 50 for index in range(5)), media_type="text/plain")
+
+    @app.get("/events")
+    async def events():
+        return StreamingResponse((f"data: {index}\n\n" for index in range(3)), media_type="text/event-stream")
+
+    @app.get("/image")
+    async def image():
+        return Response(b"\x89PNG" + b"\x00" * 5000, media_type="image/png")
+
+    return TestClient(app)
+
+
+def test_large_response_is_gzipped():
+    response = build_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "x" * 5000
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_small_response_is_sent_as_is():
+    response = build_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "x"
+
+
+def test_client_without_gzip_gets_plain_response():
+    response = build_client().get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_streamed_response_is_gzipped_as_it_streams():
+    response = build_client().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"chunk {index}\n" * 50 for index in range(5))
+
+
+def test_event_stream_is_never_gzipped():
+    with build_client(minimum_size=1).stream("GET", "/events", headers={"Accept-Encoding": "gzip"}) as response:
+        assert "content-encoding" not in response.headers
+        assert response.read() == b"data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+
+def test_image_is_never_gzipped():
+    response = build_client().get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"\x89PNG" + b"\x00" * 5000
+
+
+def test_file_sent_by_path_passes_through():
+    # A server with the ASGI pathsend extension gets the file path instead of body chunks
+    async def send_by_path(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.pathsend", "path": "/srv/large.txt"})
+
+    sent_messages = []
+
+    async def record(message):
+        sent_messages.append(message)
+
+    middleware = SelectiveGZipMiddleware(send_by_path, minimum_size=1, compresslevel=6, excluded_content_types=[])
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(middleware(scope, None, record))
+
+    assert [message["type"] for message in sent_messages] == ["http.response.start", "http.response.pathsend"]
+    assert sent_messages[0]["headers"] == [(b"content-type", b"text/plain")]
@@ -0,0 +1,130 @@
+import hashlib
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import frontier_books_api
+from frontier_books_api import COVER_CACHE_CONTROL, app, create_access_token, store_cover_assets
+
+
+def png_bytes(width: int = 600, height: int = 900) -> bytes:
+    image_file = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(image_file, format="PNG")
+    return image_file.getvalue()
+
+
+@pytest.fixture
+def cover_directory(monkeypatch, tmp_path):
+    cover_directory = tmp_path / "covers"
+    monkeypatch.setattr(frontier_books_api, "COVER_STORAGE_DIRECTORY", cover_directory)
+    return cover_directory
+
+
+def test_original_and_thumbnails_are_stored(cover_directory):
+    image_bytes = png_bytes()
+    cover_hash = hashlib.sha256(image_bytes).hexdigest()
+
+    asset_names = store_cover_assets(image_bytes, cover_hash)
+    assert asset_names == [f"{cover_hash}.png", f"{cover_hash}_w200.webp", f"{cover_hash}_w400.webp"]
+    assert (cover_directory / asset_names[0]).read_bytes() == image_bytes
+    assert not list(cover_directory.glob("*.tmp"))
+
+    for width, asset_name in zip([200, 400], asset_names[1:]):
+        with Image.open(cover_directory / asset_name) as thumbnail:
+            assert thumbnail.format == "WEBP"
+            assert thumbnail.size == (width, width * 3 // 2)
+
+
+def test_same_cover_is_stored_once(cover_directory):
+    image_bytes = png_bytes()
+    cover_hash = hashlib.sha256(image_bytes).hexdigest()
+    asset_names = store_cover_assets(image_bytes, cover_hash)
+    modified_times = [(cover_directory / asset_name).stat().st_mtime_ns for asset_name in asset_names]
+
+    assert store_cover_assets(image_bytes, cover_hash) == asset_names
+    assert [(cover_directory / asset_name).stat().st_mtime_ns for asset_name in asset_names] == modified_times
+
+
+def test_unreadable_cover_is_rejected(cover_directory):
+    with pytest.raises(OSError):
+        store_cover_assets(b"not an image", "0" * 64)
+
+    bmp_file = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(bmp_file, format="BMP")
+    with pytest.raises(ValueError):
+        store_cover_assets(bmp_file.getvalue(), "0" * 64)
+
+    assert not cover_directory.exists()
+
+
+def test_truncated_cover_stores_nothing(cover_directory):
+    image_bytes = png_bytes()[:1_000]
+
+    with pytest.raises(OSError):
+        store_cover_assets(image_bytes, hashlib.sha256(image_bytes).hexdigest())
+    assert not cover_directory.exists()
+
+
+def test_truncated_upload_is_rejected_and_never_served(cover_directory, monkeypatch):
+    # Thumbnails are built on a thread instead of the lifespan's worker processes
+    monkeypatch.setattr(app.state, "thumbnail_pool", None, raising=False)
+    monkeypatch.setattr(app.state, "db_pool", None, raising=False)
+    image_bytes = png_bytes()[:1_000]
+    admin_token = create_access_token(key_data={"user_id": 1, "user_role": "admin"})
+
+    client = TestClient(app)
+    response = client.post("/covers", files={"cover_image": ("cover.png", image_bytes, "image/png")}, headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 400
+
+    response = client.get(f"/covers/{hashlib.sha256(image_bytes).hexdigest()}.png")
+    assert response.status_code == 404
+
+
+def test_oversized_cover_is_rejected_as_invalid(cover_directory, monkeypatch):
+    # Past twice the pixel limit Pillow refuses the image outright
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1_000)
+    with pytest.raises(ValueError):
+        store_cover_assets(png_bytes(100, 100), "0" * 64)
+
+
+@pytest.fixture
+def stored_cover(cover_directory):
+    image_bytes = png_bytes()
+    asset_names = store_cover_assets(image_bytes, hashlib.sha256(image_bytes).hexdigest())
+    (cover_directory.parent / "secret.png").write_bytes(image_bytes)
+    return asset_names[0], image_bytes
+
+
+def test_stored_cover_is_served_with_long_cache(stored_cover):
+    asset_name, image_bytes = stored_cover
+    response = TestClient(app).get(f"/covers/{asset_name}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == COVER_CACHE_CONTROL
+    assert response.headers["content-type"] == "image/png"
+    assert "content-encoding" not in response.headers
+    assert response.content == image_bytes
+
+
+def test_cover_range_is_partial(stored_cover):
+    asset_name, image_bytes = stored_cover
+    response = TestClient(app).get(f"/covers/{asset_name}", headers={"Range": "bytes=0-99"})
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-99/{len(image_bytes)}"
+    assert response.content == image_bytes[:100]
+
+
+@pytest.mark.parametrize("asset_name", [
+    "missing",
+    "..%2Fsecret.png",
+    "0" * 64 + ".png",
+    "0" * 64 + ".bmp",
+    "0" * 63 + ".png",
+])
+def test_only_stored_asset_names_are_served(stored_cover, asset_name):
+    response = TestClient(app).get(f"/covers/{asset_name}")
+    assert response.status_code == 404
+
@@ -0,0 +1,203 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from frontier_books_api import LazyDBConnection, app, create_access_token, lease_pool_connection
+
+
+# --- Stand-in for an asyncpg Pool that Records Every Lease ---
+class FakeRow(dict):
+    # Records when the response body is serialised
+    def __init__(self, pool, **values):
+        super().__init__(**values)
+        self.pool = pool
+
+    def items(self):
+        self.pool.events.append(("serialize", None))
+        return super().items()
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, query, *args):
+        self.pool.events.append(("fetch", self))
+        return [FakeRow(self.pool, book_id=1, quantity=1)]
+
+    async def fetchrow(self, query, *args):
+        self.pool.events.append(("fetchrow", self))
+        # Gives every concurrent request time to take a connection before any finishes
+        await asyncio.sleep(0.01)
+        return {"balance": 100.0}
+
+    async def fetchval(self, query, *args):
+        self.pool.events.append(("fetchval", self))
+        return 1
+
+    async def execute(self, query, *args):
+        self.pool.events.append(("execute", self))
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.pool.events.append(("begin", self))
+        yield
+        self.pool.events.append(("commit", self))
+
+
+class FakePool:
+    def __init__(self):
+        self.events = []
+
+    async def acquire(self):
+        connection = FakeConnection(self)
+        self.events.append(("acquire", connection))
+        return connection
+
+    async def release(self, connection):
+        self.events.append(("release", connection))
+
+    def event_names(self) -> list:
+        return [event_name for event_name, _ in self.events]
+
+
+class BoundedFakePool(FakePool):
+    # Makes acquire wait once max_size connections are out, like asyncpg's pool
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.free_connections = asyncio.Semaphore(max_size)
+        self.connections_in_use = 0
+        self.peak_connections_in_use = 0
+
+    async def acquire(self):
+        await self.free_connections.acquire()
+        self.connections_in_use += 1
+        self.peak_connections_in_use = max(self.peak_connections_in_use, self.connections_in_use)
+        return await super().acquire()
+
+    async def release(self, connection):
+        await super().release(connection)
+        self.connections_in_use -= 1
+        self.free_connections.release()
+
+
+def test_no_query_never_acquires():
+    pool = FakePool()
+
+    async def main():
+        async with lease_pool_connection(pool):
+            pass
+
+    asyncio.run(main())
+    assert pool.events == []
+
+
+def test_connection_is_held_from_first_query_until_release():
+    pool = FakePool()
+
+    async def main():
+        db = LazyDBConnection(pool)
+        await db.fetch("SELECT 1")
+        await db.execute("SELECT 2")
+        async with db.transaction():
+            await db.execute("SELECT 3")
+        await db.fetch("SELECT 4")
+        assert pool.event_names()[-1] == "fetch"
+        await db.release()
+        await db.release()
+
+    asyncio.run(main())
+    assert pool.event_names() == ["acquire", "fetch", "execute", "begin", "execute", "commit", "fetch", "release"]
+    assert len({connection for _, connection in pool.events}) == 1
+
+
+def test_connection_is_released_when_the_block_fails():
+    pool = FakePool()
+
+    async def main():
+        async with lease_pool_connection(pool) as db:
+            await db.fetch("SELECT 1")
+            raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+    assert pool.event_names() == ["acquire", "fetch", "release"]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(app.state, "db_pool", pool, raising=False)
+    monkeypatch.setattr(app.state, "shard_pools", [pool], raising=False)
+    return pool
+
+
+def recording_client(pool) -> TestClient:
+    # Records when the response starts, to check the connection is back in the pool before it is sent
+    async def recording_app(scope, receive, send):
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                pool.events.append(("response", None))
+            await send(message)
+        await app(scope, receive, recording_send)
+
+    return TestClient(recording_app)
+
+
+def user_headers() -> dict:
+    return {"Authorization": f"Bearer {create_access_token(key_data={'user_id': 2, 'user_role': 'user'})}"}
+
+
+def test_endpoint_uses_one_connection_for_every_statement(pool):
+    cart_data = {"cart_items": [{"book_id": 1, "book_quantity": 1}, {"book_id": 2, "book_quantity": 3}]}
+    response = recording_client(pool).post("/cart", json=cart_data, headers=user_headers())
+
+    assert response.status_code == 200
+    assert pool.event_names() == ["acquire", "begin", "execute", "execute", "execute", "commit", "release", "response"]
+
+
+@pytest.mark.parametrize("path, needs_user", [("/books", False), ("/books/1", False), ("/cart", True), ("/reviews/1", False)])
+def test_connection_is_released_before_serialising(pool, path, needs_user):
+    response = recording_client(pool).get(path, headers=user_headers() if needs_user else {})
+
+    assert response.status_code == 200
+    assert pool.event_names() == ["acquire", "fetch", "release", "serialize", "response"]
+
+
+@pytest.mark.parametrize("headers, status_code", [({}, 404), ({"Authorization": "Bearer not-a-valid-token"}, 401)])
+def test_failed_authorization_never_acquires(pool, headers, status_code):
+    response = TestClient(app).post("/cart", json={"cart_items": []}, headers=headers)
+
+    assert response.status_code == status_code
+    assert pool.events == []
+
+
+GIFT_ORDER = {
+    "order_items": [{"book_id": 1, "book_quantity": 1}],
+    "order_total_cost": 10.0,
+    "order_payment_method": "gift",
+    "order_payment_details": '{"cardCode": "GIFT-0001"}',
+    "order_delivery_address": '{"street": "1 Main St"}',
+}
+
+
+@pytest.mark.parametrize("checkout_count, peak_connections", [(1, 1), (20, 10)])
+def test_gift_checkouts_share_the_unsharded_pool(monkeypatch, checkout_count, peak_connections):
+    # Unsharded, the gift card lookup and the order share one pool of 10
+    async def main():
+        pool = BoundedFakePool(max_size=10)
+        monkeypatch.setattr(app.state, "db_pool", pool, raising=False)
+        monkeypatch.setattr(app.state, "shard_pools", [pool], raising=False)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            checkouts = [client.post("/checkout", json=GIFT_ORDER, headers=user_headers()) for _ in range(checkout_count)]
+            responses = await asyncio.wait_for(asyncio.gather(*checkouts), timeout=5)
+        return pool, responses
+
+    pool, responses = asyncio.run(main())
+    assert [response.status_code for response in responses] == [200] * checkout_count
+    assert pool.peak_connections_in_use == peak_connections
+    assert pool.connections_in_use == 0
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import frontier_books_api
+from frontier_books_api import app, create_access_token, dispatch_event, stream_events, supervise_event_listener
+
+
+# --- Stand-in for an asyncpg LISTEN Connection ---
+class FakeListener:
+    def __init__(self, health_check_error=None):
+        self.health_check_error = health_check_error
+        self.termination_listeners = []
+        self.terminated = False
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    async def execute(self, query, timeout=None):
+        if self.health_check_error:
+            raise self.health_check_error
+
+    def terminate(self):
+        self.terminated = True
+
+    def lose_connection(self):
+        for callback in self.termination_listeners:
+            callback(self)
+
+
+@pytest.fixture
+def subscriber_queue():
+    queue = asyncio.Queue(maxsize=3)
+    app.state.event_subscribers = {queue}
+    yield queue
+    app.state.event_subscribers = set()
+
+
+def drain(queue) -> list:
+    return [json.loads(queue.get_nowait())["event"] for _ in range(queue.qsize())]
+
+
+def test_full_queue_drops_oldest_event(subscriber_queue):
+    for index in range(5):
+        dispatch_event(None, None, "channel", json.dumps({"event": f"event_{index}"}))
+    assert drain(subscriber_queue) == ["event_2", "event_3", "event_4"]
+
+
+def test_lost_listener_reconnects_and_sends_resync(monkeypatch, subscriber_queue):
+    first_listener, second_listener = FakeListener(), FakeListener()
+    monkeypatch.setattr(frontier_books_api, "connect_event_listener", lambda database: asyncio.sleep(0, second_listener))
+
+    async def scenario():
+        supervisor = asyncio.create_task(supervise_event_listener({}, first_listener))
+        await asyncio.sleep(0.01)
+        first_listener.lose_connection()
+        await asyncio.sleep(0.01)
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert first_listener.terminated and second_listener.terminated
+    assert drain(subscriber_queue) == ["resync"]
+
+
+def test_failed_health_check_reconnects(monkeypatch, subscriber_queue):
+    monkeypatch.setattr(frontier_books_api, "EVENT_LISTENER_HEALTH_CHECK_SECONDS", 0.01)
+    stale_listener, fresh_listener = FakeListener(health_check_error=OSError("network down")), FakeListener()
+    monkeypatch.setattr(frontier_books_api, "connect_event_listener", lambda database: asyncio.sleep(0, fresh_listener))
+
+    async def scenario():
+        supervisor = asyncio.create_task(supervise_event_listener({}, stale_listener))
+        await asyncio.sleep(0.05)
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert stale_listener.terminated
+    assert drain(subscriber_queue) == ["resync"]
+
+
+def test_unavailable_database_is_retried(monkeypatch, subscriber_queue):
+    monkeypatch.setattr(frontier_books_api, "EVENT_LISTENER_RETRY_SECONDS", 0.01)
+    listener = FakeListener()
+    attempts = []
+
+    async def connect(database):
+        attempts.append(database)
+        if len(attempts) < 3:
+            raise OSError("connection refused")
+        return listener
+
+    monkeypatch.setattr(frontier_books_api, "connect_event_listener", connect)
+
+    async def scenario():
+        supervisor = asyncio.create_task(supervise_event_listener({}))
+        await asyncio.sleep(0.1)
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert len(attempts) == 3
+    assert drain(subscriber_queue) == ["resync"]
+
+
+@pytest.mark.parametrize("user_role, expected_orders", [("user", [1]), ("admin", [1, 2])])
+def test_users_only_see_their_own_orders(user_role, expected_orders):
+    request = SimpleNamespace(app=app, is_disconnected=lambda: asyncio.sleep(0, False))
+    app.state.event_subscribers = set()
+    access_token = create_access_token({"user_id": 7, "user_role": user_role})
+
+    async def scenario():
+        response = await stream_events(request, access_token)
+
+        # The stream subscribes once it starts being iterated
+        stream = response.body_iterator
+        first_line = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        (subscriber_queue,) = app.state.event_subscribers
+        for payload in [
+            {"event": "order_created", "order_id": 1, "user_id": 7},
+            {"event": "order_created", "order_id": 2, "user_id": 8},
+            {"event": "book_changed", "book_id": 3},
+        ]:
+            subscriber_queue.put_nowait(json.dumps(payload))
+
+        lines = [await first_line] + [await stream.__anext__() for _ in range(len(expected_orders))]
+        await stream.aclose()
+        return lines
+
+    lines = asyncio.run(scenario())
+    events = [json.loads(line.split("data: ")[1]) for line in lines]
+    assert [event.get("order_id") for event in events[:-1]] == expected_orders
+    assert events[-1]["event"] == "book_changed"
+    assert app.state.event_subscribers == set()
+
+
+def test_stream_that_never_starts_leaves_no_subscriber():
+    # A client that disconnects before the first chunk never iterates the response
+    request = SimpleNamespace(app=app, is_disconnected=lambda: asyncio.sleep(0, True))
+    app.state.event_subscribers = set()
+    access_token = create_access_token({"user_id": 7, "user_role": "user"})
+
+    async def scenario():
+        response = await stream_events(request, access_token)
+        assert app.state.event_subscribers == set()
+        await response.body_iterator.aclose()
+
+    asyncio.run(scenario())
+    assert app.state.event_subscribers == set()
@@ -0,0 +1,114 @@
+import asyncio
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import frontier_books_api
+from frontier_books_api import PROFILE_HEADER, app, collapse_task_stack, create_access_token
+
+
+async def wait_for(event: asyncio.Event):
+    await event.wait()
+
+
+async def wait_in_handler(event: asyncio.Event):
+    await wait_for(event)
+
+
+def admin_headers() -> dict:
+    return {"Authorization": f"Bearer {create_access_token(key_data={'user_id': 1, 'user_role': 'admin'})}"}
+
+
+def test_suspended_task_collapses_its_await_chain():
+    async def main():
+        event = asyncio.Event()
+        task = asyncio.create_task(wait_in_handler(event))
+        await asyncio.sleep(0)
+
+        stack = collapse_task_stack(task, None)
+        event.set()
+        await task
+        return stack
+
+    stack = asyncio.run(main())
+    assert stack.startswith("[awaiting];")
+    assert [frame.split(":")[1] for frame in stack.split(";")[1:4]] == ["wait_in_handler", "wait_for", "wait"]
+
+
+def test_running_task_collapses_the_thread_stack():
+    async def main():
+        return collapse_task_stack(asyncio.current_task(), sys._getframe())
+
+    stack = asyncio.run(main())
+    assert stack.startswith("[cpu];")
+    assert stack.split(";")[-1].startswith(f"{__name__}:main:")
+
+
+def test_waiting_on_asyncpg_is_labelled():
+    # A coroutine whose module looks like asyncpg's, standing in for a query in flight
+    asyncpg_namespace = {"__name__": "asyncpg.protocol", "asyncio": asyncio}
+    exec("async def query(event):\n    await event.wait()\n", asyncpg_namespace)
+
+    async def main():
+        event = asyncio.Event()
+        task = asyncio.create_task(asyncpg_namespace["query"](event))
+        await asyncio.sleep(0)
+
+        stack = collapse_task_stack(task, None)
+        event.set()
+        await task
+        return stack
+
+    assert asyncio.run(main()).startswith("[awaiting asyncpg];asyncpg.protocol:query:")
+
+
+def test_finished_task_has_no_stack():
+    async def main():
+        task = asyncio.create_task(asyncio.sleep(0))
+        await task
+        return collapse_task_stack(task, None)
+
+    assert asyncio.run(main()) is None
+
+
+def test_profiling_is_off_without_the_header(monkeypatch):
+    monkeypatch.setattr(frontier_books_api, "PROFILE_LATENCY_THRESHOLD_SECONDS", None)
+    client = TestClient(app)
+
+    # Neither a plain request nor a non-admin asking for a profile starts the sampler
+    user_headers = {PROFILE_HEADER: "1", "Authorization": f"Bearer {create_access_token(key_data={'user_id': 2, 'user_role': 'user'})}"}
+    for headers in [{}, user_headers]:
+        response = client.get("/random/3", headers=headers)
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert frontier_books_api.profile_sampler_thread is None
+        assert not frontier_books_api.active_profiles
+
+
+def test_admin_can_request_a_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(frontier_books_api, "PROFILE_OUTPUT_DIRECTORY", tmp_path)
+
+    response = TestClient(app).get("/random/3", headers={PROFILE_HEADER: "1", **admin_headers()})
+    assert response.status_code == 200
+    assert "_GET_" in response.headers["X-Profile-Id"]
+    assert not frontier_books_api.active_profiles
+
+
+@pytest.mark.parametrize("profile_id, status_code", [
+    ("20260101T000000_GET_0a1b2c3d", 200),
+    ("missing", 404),
+    ("..%2Fsecret", 404),
+    ("20260101T000000_GET_0a1b2c3d.folded", 404),
+])
+def test_only_saved_profile_ids_are_served(monkeypatch, tmp_path, profile_id, status_code):
+    profile_directory = tmp_path / "profiles"
+    profile_directory.mkdir()
+    (profile_directory / "20260101T000000_GET_0a1b2c3d.folded").write_text("[cpu];main:handler:1 3\n")
+    (tmp_path / "secret.folded").write_text("not a profile")
+    monkeypatch.setattr(frontier_books_api, "PROFILE_OUTPUT_DIRECTORY", profile_directory)
+
+    response = TestClient(app).get(f"/profiles/{profile_id}", headers=admin_headers())
+    assert response.status_code == status_code
+    if status_code == 200:
+        assert response.text == "[cpu];main:handler:1 3\n"
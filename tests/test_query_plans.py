@@ -0,0 +1,148 @@
+import asyncio
+import json
+import re
+from argparse import Namespace
+from datetime import datetime, timezone
+
+import asyncpg
+import pytest
+
+import frontier_books_api
+from frontier_books_api import ENTRY_TABLES
+from frontier_books_config import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from frontier_books_seed import seed_database
+
+
+# --- Test Database Values ---
+TEST_DB_NAME = "frontier_books_test"
+# Shards are separate databases on the local server, each standing in for its own instance
+TEST_SHARD_DB_NAMES = [f"frontier_books_test_plans_shard_{shard_index}" for shard_index in range(2)]
+TEST_SEED_ARGUMENTS = Namespace(
+    users=500, books=2_000, orders=3_000, reviews=2_000, gift_cards=100,
+    seed=42, workers=1, chunk_size=1_000, truncate=False
+)
+
+# Full table listings scan by design
+FULL_SCAN_QUERIES = {"QUERY_GET_ALL_BOOKS", "QUERY_GET_ALL_USERS", "QUERY_GET_ALL_ORDERS"}
+
+# Sample argument per parameter type, EXPLAIN only plans the query so the values needn't exist
+SAMPLE_ARGUMENTS = {
+    "int4": 1,
+    "int8": 1,
+    "float8": 1.0,
+    "text": "sample",
+    "timestamptz": datetime.now(timezone.utc),
+    "int4[]": [1, 2, 3],
+}
+
+
+# --- Expand a Query Template into Every Form an Endpoint Sends ---
+def expand_query(query_name: str, query: str) -> list:
+    if "{entity}" in query:
+        expanded_queries = []
+        for entity, (id_field, allowed_fields) in ENTRY_TABLES.items():
+            fields = ", ".join(f"{field} = ${i+1}" for i, field in enumerate(allowed_fields))
+            expanded_queries.append((
+                f"{query_name}[{entity}]",
+                query.format(entity=entity, id_field=id_field, fields=fields, id_parameter=len(allowed_fields) + 1)
+            ))
+        return expanded_queries
+
+    return [(query_name, query.format(columns="*"))]
+
+
+# --- Every Query in frontier_books_api.py ---
+QUERIES = [
+    expanded_query
+    for query_name, query in vars(frontier_books_api).items() if query_name.startswith("QUERY_")
+    for expanded_query in expand_query(query_name, query)
+]
+
+
+# --- Collect Full Table and Full Index Scans from an EXPLAIN Plan ---
+def find_full_scans(plan_node: dict, leading_columns: dict) -> list:
+    full_scans = []
+    if plan_node.get("Node Type") == "Seq Scan":
+        full_scans.append(f"{plan_node.get('Relation Name')} (sequential scan)")
+
+    # An index only narrows the scan when its leading column is constrained,
+    # otherwise the planner is walking the whole index to stand in for a missing one
+    index_name = plan_node.get("Index Name")
+    if index_name and not re.search(rf"\b{leading_columns[index_name]}\b", plan_node.get("Index Cond", "")):
+        full_scans.append(f"{index_name} (full index scan)")
+
+    for child_node in plan_node.get("Plans", []):
+        full_scans.extend(find_full_scans(child_node, leading_columns))
+
+    return full_scans
+
+
+async def create_seeded_database() -> None:
+    db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database="postgres")
+    try:
+        for database in [TEST_DB_NAME] + TEST_SHARD_DB_NAMES:
+            await db.execute(f"DROP DATABASE IF EXISTS {database} WITH (FORCE)")
+            await db.execute(f"CREATE DATABASE {database}")
+    finally:
+        await db.close()
+
+    await seed_database(
+        TEST_SEED_ARGUMENTS,
+        {"host": DB_HOST, "port": DB_PORT, "database": TEST_DB_NAME},
+        [{"host": DB_HOST, "port": DB_PORT, "database": database} for database in TEST_SHARD_DB_NAMES]
+    )
+
+
+async def explain_query(database: str, query: str) -> list:
+    db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=database)
+    try:
+        leading_columns = {
+            row['index_name']: row['column_name'] for row in await db.fetch(
+                "SELECT pg_index.indexrelid::regclass::text AS index_name, pg_attribute.attname AS column_name FROM pg_index "
+                "JOIN pg_attribute ON pg_attribute.attrelid = pg_index.indrelid AND pg_attribute.attnum = pg_index.indkey[0]"
+            )
+        }
+        parameters = (await db.prepare(query)).get_parameters()
+        query_args = [SAMPLE_ARGUMENTS[parameter.name] for parameter in parameters]
+
+        # Make the planner pick an index whenever one exists, so small seeded
+        # tables can't hide a missing index behind a cheap sequential scan. Joins
+        # are held to index lookups too, a merge or hash join walks a whole side.
+        async with db.transaction():
+            await db.execute("SET LOCAL enable_seqscan = off")
+            await db.execute("SET LOCAL enable_mergejoin = off")
+            await db.execute("SET LOCAL enable_hashjoin = off")
+            explain_result = await db.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *query_args)
+    finally:
+        await db.close()
+
+    return find_full_scans(json.loads(explain_result)[0]["Plan"], leading_columns)
+
+
+@pytest.fixture(scope="module")
+def seeded_database():
+    try:
+        asyncio.run(create_seeded_database())
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"Postgres is not available for query plan checks ({str(e)})")
+
+
+def test_every_query_is_checked():
+    checked_queries = {query_name.split("[")[0] for query_name, _ in QUERIES}
+    assert {"QUERY_UPSERT_CART_ITEM", "QUERY_CREATE_ORDER_ITEM", "QUERY_UPDATE_ENTRY", "QUERY_GET_ALL_ORDERS"} <= checked_queries
+
+
+@pytest.mark.parametrize("database", [TEST_DB_NAME] + TEST_SHARD_DB_NAMES)
+@pytest.mark.parametrize("query_name, query", QUERIES, ids=[query_name for query_name, _ in QUERIES])
+def test_query_uses_indexes(seeded_database, database, query_name, query):
+    try:
+        full_scans = asyncio.run(explain_query(database, query))
+    except asyncpg.UndefinedTableError:
+        # Shards only hold carts and orders
+        if database == TEST_DB_NAME:
+            raise
+        pytest.skip(f"{query_name} doesn't run against shards")
+
+    if query_name in FULL_SCAN_QUERIES:
+        return
+    assert not full_scans, f"{query_name} scans all of {', '.join(full_scans)}"
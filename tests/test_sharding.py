@@ -0,0 +1,313 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+
+import frontier_books_api
+import frontier_books_migrations
+from fastapi.testclient import TestClient
+from frontier_books_api import app, create_access_token, get_order_shard_pool, get_user_shard_pool, lifespan
+from frontier_books_config import DB_USER, DB_PASSWORD, DB_NAME, DB_HOST, DB_PORT
+from frontier_books_migrations import SHARD_MIGRATIONS_DIRECTORY, apply_migrations, apply_shard_migrations, move_to_shards
+
+
+# --- Test Database Values ---
+TEST_DB_NAME = "frontier_books_test_sharded"
+# Shards are separate databases on the local server, each standing in for its own instance
+TEST_SHARD_DATABASES = [
+    {"host": DB_HOST, "port": DB_PORT, "database": f"frontier_books_test_shard_{shard_index}"}
+    for shard_index in range(2)
+]
+
+
+# --- Stand-in for an asyncpg Pool that Records Being Closed ---
+class FakePool:
+    def __init__(self, database: str, shard_count: int = 2):
+        self.database = database
+        self.shard_count = shard_count
+        self.closed = False
+
+    async def fetchrow(self, query, *args):
+        # shard_settings as recorded by the shard migrations
+        return {"shard_index": int(self.database.removeprefix("shard_")), "shard_count": self.shard_count}
+
+    async def close(self):
+        self.closed = True
+
+
+# --- Run the App's Startup and Shutdown with some Databases Unreachable ---
+def start_app(monkeypatch, created_pools: list, unreachable_databases=(), unreachable_listeners=(), recorded_shard_count=2):
+    async def create_pool(database, **kwargs):
+        if database in unreachable_databases:
+            raise OSError(f"{database} is unreachable")
+        created_pools.append(FakePool(database, recorded_shard_count))
+        return created_pools[-1]
+
+    async def connect_event_listener(listener_database):
+        if listener_database["database"] in unreachable_listeners:
+            raise OSError(f"{listener_database['database']} is unreachable")
+        return object()
+
+    async def supervise_event_listener(listener_database, event_listener=None):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(frontier_books_api.asyncpg, "create_pool", create_pool)
+    monkeypatch.setattr(frontier_books_api, "connect_event_listener", connect_event_listener)
+    monkeypatch.setattr(frontier_books_api, "supervise_event_listener", supervise_event_listener)
+    monkeypatch.setattr(frontier_books_api, "SHARD_DATABASES", [
+        {"host": "localhost", "port": 5432, "database": "shard_0"},
+        {"host": "localhost", "port": 5432, "database": "shard_1"},
+    ])
+
+    async def main():
+        async with lifespan(app):
+            pass
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("unreachable_databases, unreachable_listeners", [
+    (["shard_1"], []),
+    ([], ["shard_0"]),
+])
+def test_startup_fails_without_every_shard(monkeypatch, unreachable_databases, unreachable_listeners):
+    created_pools = []
+    with pytest.raises(OSError):
+        start_app(monkeypatch, created_pools, unreachable_databases, unreachable_listeners)
+
+    # Nothing opened before the failure is left behind
+    assert created_pools and all(pool.closed for pool in created_pools)
+    assert all(task.done() for task in app.state.event_listener_tasks)
+
+
+def test_startup_fails_without_the_main_database(monkeypatch):
+    created_pools = []
+    with pytest.raises(OSError):
+        start_app(monkeypatch, created_pools, unreachable_databases=[DB_NAME])
+
+    assert created_pools == []
+    # The thumbnail workers are shut down too
+    with pytest.raises(RuntimeError):
+        app.state.thumbnail_pool.submit(print)
+
+
+def test_startup_opens_and_shutdown_closes_every_shard(monkeypatch):
+    created_pools = []
+    start_app(monkeypatch, created_pools)
+
+    assert [pool.database for pool in created_pools] == [DB_NAME, "shard_0", "shard_1"]
+    assert all(pool.closed for pool in created_pools)
+
+
+def test_startup_refuses_a_changed_shard_count(monkeypatch):
+    created_pools = []
+    with pytest.raises(RuntimeError, match="set up as shard 0 of 3"):
+        start_app(monkeypatch, created_pools, recorded_shard_count=3)
+
+    assert all(pool.closed for pool in created_pools)
+
+
+@pytest.mark.parametrize("user_id, shard", [(1, "b"), (2, "c"), (3, "a"), (6, "a")])
+def test_users_and_their_orders_map_to_the_same_shard(user_id, shard):
+    test_app = SimpleNamespace(state=SimpleNamespace(shard_pools=["a", "b", "c"]))
+    assert get_user_shard_pool(test_app, user_id) == shard
+
+    # The shard's interleaved sequence gives its orders ids congruent to its users' ids
+    assert get_order_shard_pool(test_app, user_id + 3 * 1000) == shard
+
+
+async def recreate_databases(databases: list) -> None:
+    db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database="postgres")
+    try:
+        for database in databases:
+            await db.execute(f"DROP DATABASE IF EXISTS {database['database']} WITH (FORCE)")
+            await db.execute(f"CREATE DATABASE {database['database']}")
+    finally:
+        await db.close()
+
+
+async def fetch_rows(database: dict, query: str, *args) -> list:
+    db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **database)
+    try:
+        return [dict(row) for row in await db.fetch(query, *args)]
+    finally:
+        await db.close()
+
+
+@pytest.fixture
+def shard_databases():
+    try:
+        asyncio.run(recreate_databases(TEST_SHARD_DATABASES))
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"Postgres is not available for shard tests ({str(e)})")
+    return TEST_SHARD_DATABASES
+
+
+@pytest.fixture
+def main_database(shard_databases):
+    # Four users (user 1 is an admin) and four books, with carts and orders still unsharded
+    async def create_main_database():
+        main_database = {"host": DB_HOST, "port": DB_PORT, "database": TEST_DB_NAME}
+        await recreate_databases([main_database])
+
+        db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **main_database)
+        try:
+            await apply_migrations(db)
+            await db.execute(
+                "INSERT INTO users (username, email, password_hash, role) "
+                "SELECT 'user_' || user_id, 'user' || user_id || '@example.com', '', CASE WHEN user_id = 1 THEN 'admin' ELSE 'user' END "
+                "FROM generate_series(1, 4) AS user_id"
+            )
+            await db.execute("INSERT INTO books (title, author, price) SELECT 'Book ' || book_id, 'Author', 10 FROM generate_series(1, 4) AS book_id")
+        finally:
+            await db.close()
+        await apply_shard_migrations(shard_databases)
+        return main_database
+
+    return asyncio.run(create_main_database())
+
+
+@pytest.fixture
+def client(monkeypatch, main_database, shard_databases):
+    monkeypatch.setattr(frontier_books_api, "DB_NAME", TEST_DB_NAME)
+    monkeypatch.setattr(frontier_books_api, "SHARD_DATABASES", shard_databases)
+    with TestClient(app) as client:
+        yield client
+
+
+def user_headers(user_id: int) -> dict:
+    user_role = "admin" if user_id == 1 else "user"
+    return {"Authorization": f"Bearer {create_access_token(key_data={'user_id': user_id, 'user_role': user_role})}"}
+
+
+def place_order(client, user_id: int, book_id: int) -> int:
+    order_data = {
+        "order_items": [{"book_id": book_id, "book_quantity": 1}],
+        "order_total_cost": 10,
+        "order_payment_method": "card",
+        "order_payment_details": json.dumps({"cardNumber": "4111"}),
+        "order_delivery_address": json.dumps({"street": f"{user_id} Main Street"}),
+    }
+    response = client.post("/checkout", json=order_data, headers=user_headers(user_id))
+    assert response.status_code == 200
+    return int(response.json()["message"].rsplit(" ", 1)[1])
+
+
+def test_shard_migrations_interleave_order_ids(monkeypatch, tmp_path, shard_databases):
+    # Shard 1 already has orders from before order ids were interleaved
+    (tmp_path / "0001_user_tables.sql").write_text((SHARD_MIGRATIONS_DIRECTORY / "0001_user_tables.sql").read_text())
+    monkeypatch.setattr(frontier_books_migrations, "SHARD_DATABASES", shard_databases)
+
+    async def main():
+        shard_dbs = [await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **database) for database in shard_databases]
+        try:
+            await apply_migrations(shard_dbs[1], tmp_path)
+            for _ in range(7):
+                await shard_dbs[1].execute("INSERT INTO orders (user_id, total_amount, delivery_address, payment_info) VALUES (1, 1, '', '')")
+
+            await apply_shard_migrations()
+            return [[await shard_db.fetchval("SELECT nextval('orders_order_id_seq')") for _ in range(3)] for shard_db in shard_dbs]
+        finally:
+            for shard_db in shard_dbs:
+                await shard_db.close()
+
+    assert asyncio.run(main()) == [[2, 4, 6], [9, 11, 13]]
+
+
+def test_shard_migrations_refuse_a_changed_shard_count(monkeypatch, shard_databases):
+    monkeypatch.setattr(frontier_books_migrations, "SHARD_DATABASES", shard_databases)
+    asyncio.run(apply_shard_migrations())
+
+    monkeypatch.setattr(frontier_books_migrations, "SHARD_DATABASES", shard_databases + [{"host": DB_HOST, "port": DB_PORT, "database": DB_NAME}])
+    with pytest.raises(RuntimeError, match="lists shard 0 of 3, but that database was set up as shard 0 of 2"):
+        asyncio.run(apply_shard_migrations())
+
+
+def test_carts_and_orders_are_routed_by_user(client, shard_databases):
+    for user_id in range(1, 5):
+        response = client.post("/cart", json={"cart_items": [{"book_id": user_id % 3 + 1, "book_quantity": user_id}]}, headers=user_headers(user_id))
+        assert response.status_code == 200
+        assert client.get("/cart", headers=user_headers(user_id)).json() == {"cart_items": [{"book_id": user_id % 3 + 1, "quantity": user_id}]}
+
+    order_ids = {user_id: place_order(client, user_id, 1) for user_id in range(1, 5)}
+
+    # Each user's rows are on shard user_id % 2, and order ids map back to the same shard
+    for shard_index, shard_database in enumerate(shard_databases):
+        shard_orders = asyncio.run(fetch_rows(shard_database, "SELECT order_id, user_id FROM orders ORDER BY user_id"))
+        assert shard_orders == [{"order_id": order_ids[user_id], "user_id": user_id} for user_id in range(1, 5) if user_id % 2 == shard_index]
+        assert all(order['order_id'] % 2 == shard_index for order in shard_orders)
+
+        # Checkout emptied the carts on the same shard
+        assert asyncio.run(fetch_rows(shard_database, "SELECT * FROM cart_items")) == []
+
+    for user_id in range(1, 5):
+        user_orders = client.get("/user_orders", headers=user_headers(user_id)).json()["orders"]
+        assert [order['order_id'] for order in user_orders] == [order_ids[user_id]]
+
+
+def test_get_orders_merges_shards_in_order(client):
+    order_ids = [place_order(client, user_id, book_id) for book_id in (1, 2) for user_id in (2, 3, 4)]
+
+    response = client.get("/orders", headers=user_headers(1))
+    assert response.status_code == 200
+    orders = response.json()["orders"]
+    assert [order['order_id'] for order in orders] == order_ids
+    assert [order['created_at'] for order in orders] == sorted(order['created_at'] for order in orders)
+
+
+def test_modify_and_remove_orders_by_id(client, shard_databases):
+    order_ids = {user_id: place_order(client, user_id, 1) for user_id in (2, 3)}
+
+    for user_id, order_id in order_ids.items():
+        response = client.put(f"/modify/orders/{order_id}", json={"order_status": "Shipped"}, headers=user_headers(1))
+        assert response.status_code == 200
+        shard_database = shard_databases[user_id % 2]
+        assert asyncio.run(fetch_rows(shard_database, "SELECT order_status FROM orders WHERE order_id = $1", order_id)) == [{"order_status": "Shipped"}]
+
+    response = client.put(f"/remove/orders/{order_ids[3]}", headers=user_headers(1))
+    assert response.status_code == 200
+    assert asyncio.run(fetch_rows(shard_databases[1], "SELECT * FROM orders WHERE order_id = $1", order_ids[3])) == []
+    assert asyncio.run(fetch_rows(shard_databases[1], "SELECT * FROM order_items WHERE order_id = $1", order_ids[3])) == []
+
+    # An id that maps to a shard without that order is not found there
+    assert client.put(f"/remove/orders/{order_ids[3]}", headers=user_headers(1)).status_code == 404
+
+
+def test_move_to_shards(main_database, shard_databases):
+    async def main():
+        db = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, **main_database)
+        try:
+            # Unsharded order ids, so most don't map to their user's shard yet
+            for user_id in range(1, 5):
+                await db.execute("INSERT INTO cart_items (user_id, book_id, quantity) VALUES ($1, 1, $1)", user_id)
+                for book_id in range(1, user_id + 1):
+                    order_id = await db.fetchval("INSERT INTO orders (user_id, total_amount, delivery_address, payment_info) VALUES ($1, $2, '', '') RETURNING order_id", user_id, 10 * user_id)
+                    await db.execute("INSERT INTO order_items (order_id, book_id, quantity, unit_price) VALUES ($1, $2, 1, 10)", order_id, book_id)
+            # A removed book's lines move too
+            await db.execute("DELETE FROM books WHERE book_id = 4")
+
+            await move_to_shards(db, shard_databases)
+            return await db.fetchval("SELECT (SELECT count(*) FROM cart_items) + (SELECT count(*) FROM orders) + (SELECT count(*) FROM order_items)")
+        finally:
+            await db.close()
+
+    assert asyncio.run(main()) == 0
+
+    for shard_index, shard_database in enumerate(shard_databases):
+        shard_users = [user_id for user_id in range(1, 5) if user_id % 2 == shard_index]
+        assert asyncio.run(fetch_rows(shard_database, "SELECT user_id, quantity FROM cart_items ORDER BY user_id")) == [
+            {"user_id": user_id, "quantity": user_id} for user_id in shard_users
+        ]
+
+        # Every order is renumbered onto the shard's interleaving and keeps its own lines
+        shard_orders = asyncio.run(fetch_rows(
+            shard_database,
+            "SELECT orders.order_id, user_id, total_amount, array_agg(book_id ORDER BY book_id) AS book_ids "
+            "FROM orders JOIN order_items ON order_items.order_id = orders.order_id GROUP BY orders.order_id ORDER BY user_id, book_ids"
+        ))
+        assert all(order['order_id'] % 2 == shard_index for order in shard_orders)
+        assert [(order['user_id'], order['total_amount'], order['book_ids']) for order in shard_orders] == [
+            (user_id, 10 * user_id, [book_id if book_id != 4 else None]) for user_id in shard_users for book_id in range(1, user_id + 1)
+        ]